@@ -159,6 +159,208 @@ REST_FRAMEWORK = {
 # API KEYS
 # ======================
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
+
+# ======================
+# LLM PROVIDERS
+# ======================
+# Chat answers come from LLM_PROVIDERS[LLM_PROVIDER]. Each provider is built
+# once per process (core/llm.py). "fake" answers deterministically offline,
+# after `latency` seconds plus `token_delay` per streamed word, for load tests.
+LLM_PROVIDER = os.environ.get("LLM_PROVIDER", "gemini")
+LLM_PROVIDERS = {
+    'gemini': {
+        'backend': 'core.llm.GeminiProvider',
+        'api_key': GEMINI_API_KEY,
+        'model': os.environ.get("GEMINI_MODEL", "gemini-1.5-flash"),
+    },
+    'openai': {
+        'backend': 'core.llm.OpenAIProvider',
+        'api_key': OPENAI_API_KEY,
+        'model': os.environ.get("OPENAI_MODEL", "gpt-4o-mini"),
+    },
+    'fake': {
+        'backend': 'core.llm.FakeProvider',
+        'latency': float(os.environ.get("FAKE_LLM_LATENCY", "0.5")),
+        'token_delay': float(os.environ.get("FAKE_LLM_TOKEN_DELAY", "0.02")),
+    },
+}
+
+# Concurrent requests with an identical prompt share one in-flight generation
+LLM_COALESCE = os.environ.get("LLM_COALESCE", "True") == "True"
+
+# Admission control (core/admission.py): token buckets per process, globally and
+# per user. Calls over the limits wait up to max_wait[priority] seconds, highest
+# priority first, then get a 429. A call is charged its prompt tokens plus
+# output_tokens; after an upstream quota error nothing is admitted for cooldown s.
+# Calls that join an identical in-flight generation (LLM_COALESCE) are not charged.
+LLM_ADMISSION = {
+    'enabled': os.environ.get("LLM_ADMISSION", "True") == "True",
+    'requests_per_minute': int(os.environ.get("LLM_REQUESTS_PER_MINUTE", "60")),
+    'tokens_per_minute': int(os.environ.get("LLM_TOKENS_PER_MINUTE", "250000")),
+    'user_requests_per_minute': int(os.environ.get("LLM_USER_REQUESTS_PER_MINUTE", "10")),
+    'user_tokens_per_minute': int(os.environ.get("LLM_USER_TOKENS_PER_MINUTE", "50000")),
+    'output_tokens': 512,
+    'max_queue': 100,
+    'max_wait': {'interactive': 5, 'background': 60, 'batch': 300},
+    'cooldown': 20,
+}
+
+# Deadlines, retries, circuit breaker and hedging around the provider
+# (core/llm.py ResilientProvider). Times are in seconds. With hedge_provider
+# set (e.g. "openai"), a generate call still unanswered after the primary's
+# p95 latency is also sent there, and the first answer wins; while the
+# primary's circuit is open, calls go to the hedge provider. Sync generate
+# calls run in a pool of max_workers threads so they can be timed out.
+LLM_RESILIENCE = {
+    'enabled': os.environ.get("LLM_RESILIENCE", "True") == "True",
+    'timeout': float(os.environ.get("LLM_TIMEOUT", "30")),
+    'deadline': float(os.environ.get("LLM_DEADLINE", "60")),
+    'first_token_timeout': 15,
+    'retries': 2,
+    'backoff': 0.5,
+    'max_backoff': 4,
+    'breaker_failures': 5,
+    'breaker_reset': 30,
+    'hedge_provider': os.environ.get("LLM_HEDGE_PROVIDER", ""),
+    'hedge_percentile': 95,
+    'hedge_min_delay': 1.0,
+    'hedge_min_samples': 20,
+    'max_workers': 32,
+}
+
+# ======================
+# KNOWLEDGE BASE SEARCH
+# ======================
+# Backend used for chat context: "hybrid" (fuses the retrievers below),
+# "fts" (SQLite FTS5), "bm25" (in-memory index) or "vector" (dense embeddings,
+# matches paraphrased questions)
+SEARCH_BACKEND = os.environ.get("SEARCH_BACKEND", "hybrid")
+
+# Hybrid ranking: each retriever returns its top "candidates", the lists are
+# fused with reciprocal rank fusion (weights per retriever), the top "rerank"
+# are re-scored with article popularity and recency, then cut to the final k.
+SEARCH_RANKING = {
+    'retrievers': {'fts': 1.0, 'vector': 1.0},
+    'candidates': 50,
+    'rrf_k': 60,
+    'rerank': 20,
+    'popularity_weight': 0.1,
+    'recency_weight': 0.05,
+    'recency_half_life_days': 180,
+}
+
+# Embedder used by the vector backend; any class taking dim= with an embed(texts) method
+SEARCH_EMBEDDER = os.environ.get("SEARCH_EMBEDDER", "core.search.vector.HashingEmbedder")
+SEARCH_EMBEDDING_DIM = int(os.environ.get("SEARCH_EMBEDDING_DIM", "512"))
+
+# Approximate nearest-neighbour (IVF) index for the vector backend. Passages
+# are clustered into "nlist" lists (0 = sqrt of the corpus size) and a query
+# scores only the "nprobe" closest lists: higher nprobe = better recall, slower.
+# Below "min_vectors" exact search is used. Tune with `manage.py ann_report`.
+SEARCH_ANN = {
+    'enabled': os.environ.get("SEARCH_ANN", "True") == "True",
+    'min_vectors': int(os.environ.get("SEARCH_ANN_MIN_VECTORS", "50000")),
+    'nlist': int(os.environ.get("SEARCH_ANN_NLIST", "0")),
+    'nprobe': int(os.environ.get("SEARCH_ANN_NPROBE", "8")),
+}
+
+# Articles are split into overlapping passages of this many words for chat context
+SEARCH_CHUNK_WORDS = int(os.environ.get("SEARCH_CHUNK_WORDS", "120"))
+SEARCH_CHUNK_OVERLAP = int(os.environ.get("SEARCH_CHUNK_OVERLAP", "30"))
+
+# Passages retrieved per chat message; the prompt packer keeps what fits
+SEARCH_CONTEXT_PASSAGES = int(os.environ.get("SEARCH_CONTEXT_PASSAGES", "8"))
+
+# Seconds a cached search result is kept. Results are also keyed on a corpus
+# version bumped on every article change, so they are never served stale.
+# Use a shared cache backend (e.g. Redis) in CACHES when running several workers.
+SEARCH_CACHE_TIMEOUT = int(os.environ.get("SEARCH_CACHE_TIMEOUT", "3600"))
+
+# Maximum number of ranked matches shown on the knowledge base page
+SEARCH_MAX_RESULTS = int(os.environ.get("SEARCH_MAX_RESULTS", "200"))
+
+# Per-process semantic cache of chat answers: a question retrieving the same
+# passages as a cached one, with embeddings at least `threshold` cosine-similar,
+# gets the cached answer. Only opening questions of a conversation are cached,
+# since follow-ups depend on the history.
+ANSWER_CACHE = {
+    'enabled': os.environ.get("ANSWER_CACHE", "True") == "True",
+    'threshold': float(os.environ.get("ANSWER_CACHE_THRESHOLD", "0.9")),
+    'ttl': int(os.environ.get("ANSWER_CACHE_TTL", "3600")),
+    'max_entries': int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "5000")),
+}
+
+# Related articles precomputed for each article page (cosine similarity of
+# article embeddings), and how many nearest articles are re-checked when one changes
+RELATED_ARTICLES_COUNT = int(os.environ.get("RELATED_ARTICLES_COUNT", "3"))
+RELATED_ARTICLES_CANDIDATES = int(os.environ.get("RELATED_ARTICLES_CANDIDATES", "50"))
+
+# Articles per page on the knowledge base listing and its infinite-scroll feed
+KNOWLEDGE_BASE_PAGE_SIZE = int(os.environ.get("KNOWLEDGE_BASE_PAGE_SIZE", "24"))
+
+# ======================
+# PROMPT BUDGET
+# ======================
+# Estimated tokens for a whole chat prompt, and at most this many of them for
+# knowledge base context. Passages are packed best-first until either runs out.
+PROMPT_TOKEN_BUDGET = int(os.environ.get("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_CONTEXT_TOKENS = int(os.environ.get("PROMPT_CONTEXT_TOKENS", "1200"))
+
+# Tokens for conversation history: the rolling summary, then as many of the
+# newest messages as fit
+PROMPT_HISTORY_TOKENS = int(os.environ.get("PROMPT_HISTORY_TOKENS", "800"))
+
+# Rolling summaries (core/summaries.py): once `every` messages older than the
+# newest `keep_recent` are unsummarized, a background thread folds them into
+# the conversation's summary, kept under max_tokens
+CONVERSATION_SUMMARY = {
+    'enabled': os.environ.get("CONVERSATION_SUMMARY", "True") == "True",
+    'every': 6,
+    'keep_recent': 4,
+    'max_tokens': 300,
+}
+
+# ======================
+# CHAT STREAMING
+# ======================
+# While an answer streams, the partial assistant message is written to the
+# database at most this often (seconds), so a reload does not lose it.
+CHAT_STREAM_SAVE_INTERVAL = float(os.environ.get("CHAT_STREAM_SAVE_INTERVAL", "1.0"))
+
+# Serve the chat API with the async views in core/async_views.py. Turn this on
+# when running under ASGI (e.g. uvicorn ai_assistant.asgi:application) so
+# chats waiting on Gemini do not each hold a worker thread; leave it off
+# under gunicorn's sync WSGI workers.
+CHAT_ASYNC_VIEWS = os.environ.get("CHAT_ASYNC_VIEWS", "False") == "True"
+
+# Queue mode: the send endpoints save the question, queue a ChatJob and return
+# 202 at once; worker threads answer it (core/jobs.py) while chat.js polls.
+# With autostart the workers run inside each web process; otherwise run
+# `python manage.py run_chat_workers` separately.
+CHAT_QUEUE = {
+    'enabled': os.environ.get("CHAT_QUEUE", "False") == "True",
+    'autostart': os.environ.get("CHAT_QUEUE_AUTOSTART", "True") == "True",
+    'workers': int(os.environ.get("CHAT_QUEUE_WORKERS", "4")),
+    'poll_interval': float(os.environ.get("CHAT_QUEUE_POLL_INTERVAL", "0.5")),
+    # Running jobs older than this (seconds) are assumed orphaned and retried
+    'stale_after': int(os.environ.get("CHAT_QUEUE_STALE_AFTER", "300")),
+    'max_attempts': int(os.environ.get("CHAT_QUEUE_MAX_ATTEMPTS", "2")),
+    # A job rate limited or refused by the provider this many times fails
+    'max_deferrals': int(os.environ.get("CHAT_QUEUE_MAX_DEFERRALS", "10")),
+}
+
+# ======================
+# USAGE ACCOUNTING
+# ======================
+# Tokens, latency, model and cache hits of every assistant reply go to the
+# MessageUsage table (core/usage.py). Rows are buffered and written by a
+# background thread once batch_size are waiting or every flush_interval seconds.
+USAGE_ACCOUNTING = {
+    'enabled': os.environ.get("USAGE_ACCOUNTING", "True") == "True",
+    'batch_size': 200,
+    'flush_interval': 5.0,
+}
 
 # ======================
 # EMAIL (SENDGRID – PRODUCTION READY)
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Category, Article, Conversation, Message, UserProfile, Notification, UserSettings, Enquiry,EmailOTP
+from .models import Category, Article, ArticleChunk, RelatedArticle, Conversation, Message, ChatJob, MessageUsage, UserProfile, Notification, UserSettings, Enquiry,EmailOTP
+from .search.indexing import reindex_articles
+from . import usage
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -21,17 +23,34 @@ class ArticleAdmin(admin.ModelAdmin):
         return form
     
     # Add bulk actions to publish/unpublish articles
+    # queryset.update() skips post_save, so re-index the affected articles in one batch
     def publish_articles(self, request, queryset):
+        article_ids = list(queryset.values_list('id', flat=True))
         queryset.update(is_published=True)
-        self.message_user(request, f'{queryset.count()} article(s) published.')
+        reindex_articles(article_ids)
+        self.message_user(request, f'{len(article_ids)} article(s) published.')
     publish_articles.short_description = "Publish selected articles"
     
     def unpublish_articles(self, request, queryset):
+        article_ids = list(queryset.values_list('id', flat=True))
         queryset.update(is_published=False)
-        self.message_user(request, f'{queryset.count()} article(s) unpublished.')
+        reindex_articles(article_ids)
+        self.message_user(request, f'{len(article_ids)} article(s) unpublished.')
     unpublish_articles.short_description = "Unpublish selected articles"
     
     actions = ['publish_articles', 'unpublish_articles']
+
+@admin.register(ArticleChunk)
+class ArticleChunkAdmin(admin.ModelAdmin):
+    list_display = ['title', 'position', 'start']
+    search_fields = ['title', 'text']
+    raw_id_fields = ['article']
+
+@admin.register(RelatedArticle)
+class RelatedArticleAdmin(admin.ModelAdmin):
+    list_display = ['article', 'rank', 'related', 'score']
+    raw_id_fields = ['article', 'related']
+
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
     list_display = ['user', 'title', 'created_at']
@@ -42,6 +61,31 @@ class MessageAdmin(admin.ModelAdmin):
     list_display = ['conversation', 'role', 'timestamp']
     list_filter = ['role', 'timestamp']
 
+@admin.register(ChatJob)
+class ChatJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'conversation', 'status', 'attempts', 'worker', 'created_at', 'finished_at']
+    list_filter = ['status']
+    raw_id_fields = ['conversation', 'user_message', 'ai_message']
+
+@admin.register(MessageUsage)
+class MessageUsageAdmin(admin.ModelAdmin):
+    list_display = ['message', 'user', 'model', 'prompt_tokens', 'completion_tokens', 'retrieval_ms', 'generation_ms', 'answer_cache_hit', 'search_cache_hit', 'created_at']
+    list_filter = ['model', 'answer_cache_hit', 'search_cache_hit', 'created_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['message', 'user']
+    date_hierarchy = 'created_at'
+    
+    # Roll the filtered rows up by day, user and model above the list
+    def changelist_view(self, request, extra_context=None):
+        response = super().changelist_view(request, extra_context)
+        try:
+            queryset = response.context_data['cl'].queryset
+        except (AttributeError, KeyError):
+            return response
+        response.context_data['rollup'] = usage.rollup(queryset)[:100]
+        response.context_data['top_conversations'] = usage.top_conversations(queryset)
+        return response
+
 @admin.register(UserProfile)
 class UserProfileAdmin(admin.ModelAdmin):
     list_display = ['user', 'total_conversations', 'total_messages', 'joined_date']
@@ -0,0 +1,222 @@
+"""
+Admission control for LLM calls.
+
+Every model call must first be admitted against token buckets, refilled
+continuously: global requests/tokens per minute, and the same per user. A
+call that would exceed them waits in a bounded queue ordered by priority
+(interactive chat before background jobs before batch runs) for at most
+LLM_ADMISSION['max_wait'][priority] seconds. If it cannot be admitted in
+time it is shed with RateLimited, which the views turn into a 429, instead
+of spending a failed upstream call. When the provider itself reports a quota
+error anyway, throttle() empties the global buckets for 'cooldown' seconds.
+
+Buckets are per process: divide the provider quota by the number of worker
+processes when setting the limits.
+"""
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .prompts import estimate_tokens
+
+PRIORITIES = {'interactive': 0, 'background': 1, 'batch': 2}
+
+MAX_TRACKED_USERS = 10000
+
+
+class RateLimited(Exception):
+    """A model call was refused; retry_after is a hint in seconds"""
+    status = 429
+
+    def __init__(self, retry_after, reason='rate limit'):
+        self.retry_after = max(1, math.ceil(retry_after))
+        self.reason = reason
+        super().__init__(
+            f"The assistant is handling a lot of questions right now ({reason}). "
+            f"Please try again in {self.retry_after} seconds."
+        )
+
+
+class TokenBucket:
+    """Holds up to `per_minute` units and refills at per_minute / 60 units a second"""
+
+    def __init__(self, per_minute):
+        self.rate = per_minute / 60.0
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount units are available (amounts above capacity count as a full bucket)"""
+        self.refill(now)
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.level) / self.rate) if self.rate else math.inf
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + min(amount, self.capacity))
+
+    def drain(self, seconds, now):
+        """Empty the bucket so nothing is available for the next `seconds`"""
+        self.refill(now)
+        self.level = min(self.level, -seconds * self.rate)
+
+
+class AdmissionController:
+    def __init__(self, requests_per_minute, tokens_per_minute, user_requests_per_minute,
+                 user_tokens_per_minute, max_queue, max_wait):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.user_limits = (user_requests_per_minute, user_tokens_per_minute)
+        self.users = OrderedDict()  # user key -> (requests bucket, tokens bucket), least recently used first
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.waiting = []  # heap of (priority, sequence)
+        self.sequence = itertools.count()
+        self.changed = threading.Condition()
+        self.admitted = 0
+        self.shed = 0
+        self.throttled = 0
+
+    def user_buckets(self, user_key):
+        buckets = self.users.get(user_key)
+        if buckets is None:
+            buckets = self.users[user_key] = tuple(TokenBucket(limit) for limit in self.user_limits)
+            while len(self.users) > MAX_TRACKED_USERS:
+                self.users.popitem(last=False)
+        self.users.move_to_end(user_key)
+        return buckets
+
+    def admit(self, user_key, tokens, priority='interactive'):
+        """Block until the call fits every bucket, or raise RateLimited"""
+        deadline = time.monotonic() + self.max_wait[priority]
+        with self.changed:
+            if user_key is not None:
+                self._reserve_user(user_key, tokens, deadline)
+            try:
+                self._wait_global(tokens, PRIORITIES[priority], deadline)
+            except RateLimited:
+                if user_key is not None:
+                    user_requests, user_tokens = self.user_buckets(user_key)
+                    user_requests.give_back(1)
+                    user_tokens.give_back(tokens)
+                self.shed += 1
+                raise
+            self.admitted += 1
+
+    def _reserve_user(self, user_key, tokens, deadline):
+        """Take from the user's own buckets first, so one user's backlog never blocks the queue"""
+        while True:
+            now = time.monotonic()
+            user_requests, user_tokens = self.user_buckets(user_key)
+            wait = max(user_requests.wait_time(1, now), user_tokens.wait_time(tokens, now))
+            if wait == 0:
+                user_requests.take(1)
+                user_tokens.take(tokens)
+                return
+            if now + wait > deadline:
+                self.shed += 1
+                raise RateLimited(wait, 'per-user limit')
+            self.changed.wait(timeout=wait)
+
+    def _wait_global(self, tokens, priority, deadline):
+        if len(self.waiting) >= self.max_queue:
+            raise RateLimited(1, 'queue full')
+        entry = (priority, next(self.sequence))
+        heapq.heappush(self.waiting, entry)
+        try:
+            while True:
+                now = time.monotonic()
+                wait = max(self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                if self.waiting[0] == entry:
+                    if wait == 0:
+                        self.requests.take(1)
+                        self.tokens.take(tokens)
+                        return
+                    if now + wait > deadline:
+                        raise RateLimited(wait, 'global limit')
+                elif now >= deadline:
+                    raise RateLimited(max(wait, 1), 'queue wait')
+                self.changed.wait(timeout=max(0.01, min(wait or deadline - now, deadline - now)))
+        finally:
+            self.waiting.remove(entry)
+            heapq.heapify(self.waiting)
+            self.changed.notify_all()
+
+    def drain(self, seconds):
+        with self.changed:
+            now = time.monotonic()
+            self.requests.drain(seconds, now)
+            self.tokens.drain(seconds, now)
+            self.throttled += 1
+
+    def stats(self):
+        return {
+            'throttled': self.throttled,
+            'admitted': self.admitted,
+            'shed': self.shed,
+            'waiting': len(self.waiting),
+            'requests_available': round(self.requests.level, 1),
+            'tokens_available': round(self.tokens.level),
+        }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                config = settings.LLM_ADMISSION
+                _controller = AdmissionController(
+                    config['requests_per_minute'], config['tokens_per_minute'],
+                    config['user_requests_per_minute'], config['user_tokens_per_minute'],
+                    config['max_queue'], config['max_wait'],
+                )
+    return _controller
+
+
+def reset_controller():
+    global _controller
+    with _controller_lock:
+        _controller = None
+
+
+def admit(user, prompt, priority='interactive'):
+    """
+    Admit one model call for user with this prompt, or raise RateLimited.
+    user is a User or an id, or None for calls made on nobody's behalf (e.g.
+    batch runs), which only count against the global buckets.
+    """
+    config = settings.LLM_ADMISSION
+    if not config['enabled']:
+        return
+    user_key = getattr(user, 'pk', user)
+    tokens = estimate_tokens(prompt) + config['output_tokens']
+    get_controller().admit(user_key, tokens, priority)
+
+
+def throttle():
+    """Back off after an upstream quota error; returns the RateLimited to raise"""
+    config = settings.LLM_ADMISSION
+    if config['enabled']:
+        get_controller().drain(config['cooldown'])
+    return RateLimited(config['cooldown'], 'provider quota')
+
+
+def stats():
+    return _controller.stats() if _controller is not None else {}
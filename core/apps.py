@@ -6,3 +6,8 @@ class CoreConfig(AppConfig):
     
     def ready(self):
         import core.signals
+        from django.core.signals import request_started
+        from core.search.suggest import warm_up
+        
+        # Build the typeahead trie as soon as the worker starts serving
+        request_started.connect(warm_up, dispatch_uid='warm_suggest_index')
@@ -0,0 +1,245 @@
+"""
+Async versions of the chat API views.
+
+Under an ASGI server (ai_assistant/asgi.py) a request waiting on Gemini only
+holds a coroutine, not a worker thread, so one worker can keep hundreds of
+chats in flight. urls.py routes the chat API here when CHAT_ASYNC_VIEWS is on;
+the sync views in views.py stay in place for WSGI deployments.
+"""
+import json
+import time
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db.models import F
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+
+from .models import Conversation, Message, Notification, UserProfile, UserSettings
+from .utils import aget_ai_response, astream_ai_response, search_knowledge_base, generate_conversation_title
+from . import jobs
+from . import usage as usage_log
+from .admission import RateLimited
+from .llm import ProviderUnavailable
+from .summaries import maybe_summarize, recent_messages
+from .views import message_data, queued_response, retry_later_response, sse_event
+
+
+def async_login_required(methods):
+    """login_required plus require_http_methods for async views (Django 4.2's are sync-only)"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            # Resolve the lazy request.user (a session and user query) off the event loop
+            is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+            if not is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def arecord_exchange(user, conversation, user_message):
+    """Async record_exchange"""
+    if await conversation.messages.acount() == 2:
+        conversation.title = generate_conversation_title(user_message)
+    conversation.preview = user_message[:100]
+    await conversation.asave(update_fields=['title', 'preview', 'updated_at'])
+
+    profile, created = await UserProfile.objects.aget_or_create(user=user)
+    await UserProfile.objects.filter(id=profile.id).aupdate(total_messages=F('total_messages') + 2)
+
+    user_settings, created = await UserSettings.objects.aget_or_create(user=user)
+    if user_settings.chat_notifications:
+        await Notification.objects.acreate(
+            user=user,
+            title="AI Response Received",
+            message=f"Your question about '{user_message[:50]}...' has been answered.",
+            notification_type='chat'
+        )
+    await sync_to_async(maybe_summarize)(conversation)
+
+
+async def save_question(request):
+    """Parse a chat request and save the user message; None if the request is invalid, Http404 if the conversation is not the user's"""
+    data = json.loads(request.body)
+    conversation_id = data.get('conversation_id')
+    user_message = data.get('message')
+    if not conversation_id or not user_message:
+        return None
+
+    try:
+        conversation = await Conversation.objects.aget(id=conversation_id, user=request.user)
+    except Conversation.DoesNotExist:
+        # As get_object_or_404 in the sync views (Django 4.2 has no async version)
+        raise Http404("No Conversation matches the given query.")
+    user_msg = await Message.objects.acreate(conversation=conversation, role='user', content=user_message)
+    return conversation, user_message, user_msg
+
+
+async def gather_context(conversation, user_message, usage):
+    """Recent history and knowledge base passages for the prompt"""
+    history = await sync_to_async(recent_messages)(conversation)
+    context = await sync_to_async(search_knowledge_base)(user_message, usage=usage)
+    return history, context
+
+
+async def enqueue(conversation, user_msg):
+    job = await sync_to_async(jobs.enqueue)(conversation, user_msg)
+    return queued_response(job, user_msg)
+
+
+@async_login_required(["POST"])
+async def create_conversation(request):
+    try:
+        data = json.loads(request.body)
+        conversation = await Conversation.objects.acreate(
+            user=request.user,
+            title=data.get('title', 'New Conversation')
+        )
+        await UserProfile.objects.filter(user=request.user).aupdate(
+            total_conversations=F('total_conversations') + 1
+        )
+
+        return JsonResponse({
+            'id': conversation.id,
+            'title': conversation.title,
+            'created_at': conversation.created_at.isoformat()
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@async_login_required(["POST"])
+async def send_message(request):
+    try:
+        question = await save_question(request)
+        if question is None:
+            return JsonResponse({'error': 'Invalid request'}, status=400)
+        conversation, user_message, user_msg = question
+        if settings.CHAT_QUEUE['enabled']:
+            return await enqueue(conversation, user_msg)
+
+        usage = {}
+        history, context = await gather_context(conversation, user_message, usage)
+        try:
+            ai_response = await aget_ai_response(
+                user_message, context, history, conversation.summary, user=request.user, usage=usage
+            )
+        except (RateLimited, ProviderUnavailable) as e:
+            await user_msg.adelete()
+            return retry_later_response(e)
+        ai_msg = await Message.objects.acreate(conversation=conversation, role='assistant', content=ai_response)
+        usage_log.record(ai_msg, request.user, usage)
+        await arecord_exchange(request.user, conversation, user_message)
+
+        return JsonResponse({
+            'user_message': message_data(user_msg),
+            'ai_message': message_data(ai_msg)
+        })
+    except Http404:
+        raise
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@async_login_required(["POST"])
+async def send_message_stream(request):
+    """Async send_message_stream; see views.send_message_stream"""
+    try:
+        question = await save_question(request)
+    except Http404:
+        raise
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    if question is None:
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    conversation, user_message, user_msg = question
+    if settings.CHAT_QUEUE['enabled']:
+        return await enqueue(conversation, user_msg)
+    usage = {}
+    try:
+        history, context = await gather_context(conversation, user_message, usage)
+    except Exception as e:
+        await user_msg.adelete()
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        pieces = await astream_ai_response(
+            user_message, context, history, conversation.summary, user=request.user, usage=usage
+        )
+    except (RateLimited, ProviderUnavailable) as e:
+        await user_msg.adelete()
+        return retry_later_response(e)
+    ai_msg = await Message.objects.acreate(conversation=conversation, role='assistant', content='')
+
+    async def events():
+        parts = []
+        saved_at = time.monotonic()
+        finished = False
+        try:
+            yield sse_event({'user_message': message_data(user_msg), 'ai_message': message_data(ai_msg)}, 'start')
+            async for text in pieces:
+                parts.append(text)
+                yield sse_event({'delta': text})
+                if time.monotonic() - saved_at >= settings.CHAT_STREAM_SAVE_INTERVAL:
+                    await Message.objects.filter(id=ai_msg.id).aupdate(content=''.join(parts))
+                    saved_at = time.monotonic()
+            finished = True
+        finally:
+            await pieces.aclose()
+            ai_msg.content = ''.join(parts)
+            await Message.objects.filter(id=ai_msg.id).aupdate(content=ai_msg.content)
+            usage_log.record(ai_msg, request.user, usage)
+            await arecord_exchange(request.user, conversation, user_message)
+        if finished:
+            yield sse_event({'ai_message': message_data(ai_msg)}, 'done')
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@async_login_required(["GET"])
+async def get_conversation_messages(request, conversation_id):
+    try:
+        conversation = await Conversation.objects.aget(id=conversation_id, user=request.user)
+        messages_data = [message_data(msg) async for msg in conversation.messages.all()]
+
+        return JsonResponse({
+            'id': conversation.id,
+            'title': conversation.title,
+            'messages': messages_data
+        })
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@async_login_required(["GET"])
+async def list_conversations(request):
+    try:
+        conversations_data = [
+            {
+                'id': conv.id,
+                'title': conv.title,
+                'preview': conv.preview,
+                'created_at': conv.created_at.isoformat()
+            }
+            async for conv in Conversation.objects.filter(user=request.user)
+        ]
+        return JsonResponse({'conversations': conversations_data})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+
+@async_login_required(["DELETE"])
+async def delete_conversation(request, conversation_id):
+    try:
+        conversation = await Conversation.objects.aget(id=conversation_id, user=request.user)
+        await conversation.adelete()
+        return JsonResponse({'message': 'Deleted'})
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=400)
@@ -0,0 +1,134 @@
+"""
+Database-backed queue for chat answers.
+
+With CHAT_QUEUE['enabled'], the send views save the user's message, enqueue a
+ChatJob and return 202 at once. A pool of worker threads then does the
+retrieval, generation and writes outside the request. The threads start in
+the web process on first enqueue, or in their own process with
+`manage.py run_chat_workers`. The ChatJob table is the queue, so no broker is
+needed. Claiming is a conditional UPDATE, so any number of workers in any
+number of processes can share it.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .admission import RateLimited
+from .llm import ProviderUnavailable
+from .models import ChatJob, Message
+from . import usage as usage_log
+
+logger = logging.getLogger(__name__)
+
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def enqueue(conversation, user_msg):
+    """Queue an answer to user_msg and make sure this process has workers to run it"""
+    job = ChatJob.objects.create(conversation=conversation, user_message=user_msg)
+    if settings.CHAT_QUEUE['autostart']:
+        start_workers()
+    return job
+
+
+def requeue_stale():
+    """Put back jobs whose worker died mid-run; give up after max_attempts"""
+    config = settings.CHAT_QUEUE
+    cutoff = timezone.now() - timedelta(seconds=config['stale_after'])
+    stale = ChatJob.objects.filter(status='running', started_at__lt=cutoff)
+    stale.filter(attempts__gte=config['max_attempts']).update(
+        status='failed', error='Worker stopped before finishing', finished_at=timezone.now()
+    )
+    stale.update(status='queued', worker='')
+
+
+def claim_next(worker):
+    """Atomically take the oldest queued job, or return None if the queue is empty"""
+    for job_id in ChatJob.objects.filter(status='queued').values_list('id', flat=True)[:5]:
+        claimed = ChatJob.objects.filter(id=job_id, status='queued').update(
+            status='running', worker=worker, started_at=timezone.now(), attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ChatJob.objects.select_related('conversation__user', 'user_message').get(id=job_id)
+    return None
+
+
+def process(job):
+    """Generate and save the answer for one claimed job"""
+    from .summaries import recent_messages
+    from .utils import get_ai_response, record_exchange, search_knowledge_base
+
+    conversation = job.conversation
+    user_message = job.user_message.content
+    history = recent_messages(conversation, until=job.user_message.timestamp)
+    usage = {}
+    context = search_knowledge_base(user_message, usage=usage)
+    ai_response = get_ai_response(
+        user_message, context, history, conversation.summary, user=conversation.user, priority='background',
+        usage=usage,
+    )
+
+    # A worker dying in between must not leave an answer behind a job that will run again
+    with transaction.atomic():
+        ai_msg = Message.objects.create(conversation=conversation, role='assistant', content=ai_response)
+        ChatJob.objects.filter(id=job.id).update(status='done', ai_message=ai_msg, finished_at=timezone.now())
+    usage_log.record(ai_msg, conversation.user, usage)
+    record_exchange(conversation.user, conversation, user_message)
+
+
+def work(worker, stop=None):
+    """Worker loop: claim and process jobs until stop is set"""
+    config = settings.CHAT_QUEUE
+    last_sweep = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        try:
+            if time.monotonic() - last_sweep > config['stale_after'] / 2:
+                requeue_stale()
+                last_sweep = time.monotonic()
+            job = claim_next(worker)
+        except Exception:
+            logger.exception("Chat worker %s could not read the queue", worker)
+            job = None
+        if job is None:
+            time.sleep(config['poll_interval'])
+            continue
+        try:
+            process(job)
+        except (RateLimited, ProviderUnavailable) as e:
+            # Over quota or provider down: hand the job back without counting the attempt and wait,
+            # up to max_deferrals times
+            deferred = ChatJob.objects.filter(id=job.id, deferrals__lt=config['max_deferrals']).update(
+                status='queued', worker='', attempts=F('attempts') - 1, deferrals=F('deferrals') + 1
+            )
+            if deferred:
+                logger.info("Chat job %s deferred %ss: %s", job.id, e.retry_after, e)
+                time.sleep(e.retry_after)
+            else:
+                logger.warning("Chat job %s failed after %s deferrals", job.id, config['max_deferrals'])
+                ChatJob.objects.filter(id=job.id).update(status='failed', error=str(e), finished_at=timezone.now())
+        except Exception as e:
+            logger.exception("Chat job %s failed", job.id)
+            ChatJob.objects.filter(id=job.id).update(status='failed', error=str(e), finished_at=timezone.now())
+    connection.close()
+
+
+def start_workers(count=None, stop=None):
+    """Start this process's worker threads once; returns them"""
+    with _workers_lock:
+        if not _workers:
+            count = count or settings.CHAT_QUEUE['workers']
+            for n in range(count):
+                worker = f"{os.getpid()}-{n}"
+                thread = threading.Thread(target=work, args=(worker, stop), name=f"chat-worker-{n}", daemon=True)
+                thread.start()
+                _workers.append(thread)
+        return list(_workers)
@@ -0,0 +1,1046 @@
+"""
+LLM providers behind one interface.
+
+Every provider offers generate/stream and their async twins agenerate/astream,
+all taking a finished prompt string. Providers are configured in
+LLM_PROVIDERS and built once per process by get_provider(), so the SDK clients
+and their HTTP/gRPC connections are reused across requests instead of being
+set up per call.
+"""
+import asyncio
+import hashlib
+import math
+import queue
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+GENERATION_CONFIG = {
+    'temperature': 0.7,
+    'top_p': 1,
+    'top_k': 1,
+    'max_output_tokens': 2048,
+}
+
+
+class LLMProvider:
+    name = None
+    model_name = ''
+
+    @property
+    def available(self):
+        """False when the provider cannot be called, e.g. no API key is set"""
+        return True
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+    def stream(self, prompt):
+        yield self.generate(prompt)
+
+    async def agenerate(self, prompt):
+        raise NotImplementedError
+
+    async def astream(self, prompt):
+        yield await self.agenerate(prompt)
+
+    # The *_admitted variants call admit() (a callable raising RateLimited)
+    # before the model is called. Single-flight wrappers only run it for the
+    # call that actually reaches the model.
+
+    def generate_admitted(self, prompt, admit):
+        admit()
+        return self.generate(prompt)
+
+    def stream_admitted(self, prompt, admit):
+        admit()
+        return self.stream(prompt)
+
+    async def agenerate_admitted(self, prompt, admit):
+        await admit()
+        return await self.agenerate(prompt)
+
+    async def astream_admitted(self, prompt, admit):
+        await admit()
+        async for text in self.astream(prompt):
+            yield text
+
+    def describe_error(self, e):
+        """Turn an exception from this provider into a message for the chat window"""
+        return f"Error: {e}"
+
+    def is_rate_limit(self, e):
+        """True when e means the upstream quota or rate limit was hit"""
+        message = str(e).lower()
+        return '429' in message or 'quota' in message or 'rate limit' in message
+
+    def is_transient(self, e):
+        """True for errors worth retrying: timeouts, dropped connections and 5xx responses"""
+        if isinstance(e, (TimeoutError, ConnectionError)):
+            return True
+        message = str(e).lower()
+        return any(sign in message for sign in ('500', '502', '503', '504', 'unavailable', 'deadline exceeded'))
+
+    def stats(self):
+        return {}
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini; one GenerativeModel (and its gRPC channel) per process"""
+    name = 'gemini'
+
+    def __init__(self, api_key='', model='gemini-1.5-flash', generation_config=None):
+        import google.generativeai as genai
+
+        self.genai = genai
+        self.api_key = api_key
+        self.generation_config = generation_config or GENERATION_CONFIG
+        self.model_name = model
+        if api_key:
+            genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model)
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    @staticmethod
+    def text_of(chunk):
+        try:
+            return chunk.text
+        except ValueError:
+            # A chunk without text parts (e.g. only safety ratings)
+            return ''
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt, generation_config=self.generation_config).text
+
+    def stream(self, prompt):
+        response = self.model.generate_content(prompt, generation_config=self.generation_config, stream=True)
+        for chunk in response:
+            text = self.text_of(chunk)
+            if text:
+                yield text
+
+    async def agenerate(self, prompt):
+        response = await self.model.generate_content_async(prompt, generation_config=self.generation_config)
+        return response.text
+
+    async def astream(self, prompt):
+        response = await self.model.generate_content_async(
+            prompt, generation_config=self.generation_config, stream=True
+        )
+        async for chunk in response:
+            text = self.text_of(chunk)
+            if text:
+                yield text
+
+    def describe_error(self, e):
+        error_msg = str(e)
+
+        # If model not found, try listing available models
+        if "404" in error_msg or "not found" in error_msg.lower():
+            try:
+                available_models = [m.name for m in self.genai.list_models()]
+                return f"Model error. Available models: {', '.join(available_models[:5])}. Please update LLM_PROVIDERS with a valid model name."
+            except Exception:
+                return f"Error: Unable to access Gemini API. Please check your API key. Details: {error_msg}"
+
+        return f"Error: {error_msg}"
+
+    def is_rate_limit(self, e):
+        from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+
+        return isinstance(e, (ResourceExhausted, TooManyRequests)) or super().is_rate_limit(e)
+
+    def is_transient(self, e):
+        from google.api_core.exceptions import ServerError
+
+        return isinstance(e, ServerError) or super().is_transient(e)
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions over pooled keep-alive httpx clients"""
+    name = 'openai'
+
+    def __init__(self, api_key='', model='gpt-4o-mini', generation_config=None, timeout=60, max_retries=2,
+                 max_connections=100):
+        try:
+            import httpx
+            import openai
+        except ImportError:
+            raise ImproperlyConfigured("The 'openai' provider needs the openai package (pip install openai)")
+
+        self.api_key = api_key
+        self.model = self.model_name = model
+        config = generation_config or GENERATION_CONFIG
+        options = {
+            'temperature': config.get('temperature'),
+            'top_p': config.get('top_p'),
+            'max_tokens': config.get('max_output_tokens'),
+        }
+        self.options = {key: value for key, value in options.items() if value is not None}
+        self.rate_limit_error = openai.RateLimitError
+        self.transient_errors = (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.client = openai.OpenAI(
+            api_key=api_key or 'unset', max_retries=max_retries,
+            http_client=httpx.Client(limits=limits, timeout=timeout),
+        )
+        self.async_client = openai.AsyncOpenAI(
+            api_key=api_key or 'unset', max_retries=max_retries,
+            http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+        )
+
+    @property
+    def available(self):
+        return bool(self.api_key)
+
+    def is_rate_limit(self, e):
+        return isinstance(e, self.rate_limit_error)
+
+    def is_transient(self, e):
+        return isinstance(e, self.transient_errors) or super().is_transient(e)
+
+    def messages(self, prompt):
+        return [{'role': 'user', 'content': prompt}]
+
+    def generate(self, prompt):
+        response = self.client.chat.completions.create(
+            model=self.model, messages=self.messages(prompt), **self.options
+        )
+        return response.choices[0].message.content or ''
+
+    def stream(self, prompt):
+        response = self.client.chat.completions.create(
+            model=self.model, messages=self.messages(prompt), stream=True, **self.options
+        )
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def agenerate(self, prompt):
+        response = await self.async_client.chat.completions.create(
+            model=self.model, messages=self.messages(prompt), **self.options
+        )
+        return response.choices[0].message.content or ''
+
+    async def astream(self, prompt):
+        response = await self.async_client.chat.completions.create(
+            model=self.model, messages=self.messages(prompt), stream=True, **self.options
+        )
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class FakeProvider(LLMProvider):
+    """
+    Deterministic offline provider for development and load tests. The answer
+    depends only on the prompt; latency is the wait before the first token and
+    token_delay the wait between streamed words.
+    """
+    name = 'fake'
+    model_name = 'fake'
+
+    QUESTION_RE = re.compile(r"^User: (.*)$", re.MULTILINE)
+    WORDS = (
+        "the knowledge base suggests checking settings first then reviewing the "
+        "related articles for step by step guidance and contacting support if needed"
+    ).split()
+
+    def __init__(self, latency=0.0, token_delay=0.0, words=40):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.words = words
+
+    def answer(self, prompt):
+        questions = self.QUESTION_RE.findall(prompt)
+        question = questions[-1].strip() if questions else prompt[-80:].strip()
+        seed = int(hashlib.sha1(prompt.encode()).hexdigest(), 16)
+        filler = [self.WORDS[(seed >> (i % 64)) % len(self.WORDS)] for i in range(self.words)]
+        return f'Simulated answer to "{question}": ' + ' '.join(filler) + '.'
+
+    def pieces(self, prompt):
+        words = self.answer(prompt).split(' ')
+        return [word + ' ' for word in words[:-1]] + words[-1:]
+
+    def generate(self, prompt):
+        time.sleep(self.latency + self.token_delay * self.words)
+        return self.answer(prompt)
+
+    def stream(self, prompt):
+        time.sleep(self.latency)
+        for n, piece in enumerate(self.pieces(prompt)):
+            if n:
+                time.sleep(self.token_delay)
+            yield piece
+
+    async def agenerate(self, prompt):
+        await asyncio.sleep(self.latency + self.token_delay * self.words)
+        return self.answer(prompt)
+
+    async def astream(self, prompt):
+        await asyncio.sleep(self.latency)
+        for n, piece in enumerate(self.pieces(prompt)):
+            if n:
+                await asyncio.sleep(self.token_delay)
+            yield piece
+
+
+class Flight:
+    """One in-flight generation whose text pieces every caller with the same prompt reads"""
+
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.changed = threading.Condition()
+
+    def push(self, text):
+        with self.changed:
+            self.parts.append(text)
+            self.changed.notify_all()
+
+    def finish(self, error=None):
+        with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    def follow(self):
+        seen = 0
+        while True:
+            with self.changed:
+                self.changed.wait_for(lambda: self.done or len(self.parts) > seen)
+                parts, done, error = self.parts[seen:], self.done, self.error
+            seen += len(parts)
+            yield from parts
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class AsyncFlight:
+    """Flight for coroutines on one event loop"""
+
+    def __init__(self):
+        self.parts = []
+        self.done = False
+        self.error = None
+        self.changed = asyncio.Condition()
+
+    async def push(self, text):
+        async with self.changed:
+            self.parts.append(text)
+            self.changed.notify_all()
+
+    async def finish(self, error=None):
+        async with self.changed:
+            self.done = True
+            self.error = error
+            self.changed.notify_all()
+
+    async def follow(self):
+        seen = 0
+        while True:
+            async with self.changed:
+                await self.changed.wait_for(lambda: self.done or len(self.parts) > seen)
+                parts, done, error = self.parts[seen:], self.done, self.error
+            seen += len(parts)
+            for part in parts:
+                yield part
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class Refused(Exception):
+    """A flight's first caller was not admitted; error is its RateLimited"""
+
+    def __init__(self, error):
+        self.error = error
+        super().__init__(str(error))
+
+
+class CoalescingProvider(LLMProvider):
+    """
+    Single-flight wrapper: concurrent calls with an identical prompt share one
+    upstream generation instead of each calling the model.
+
+    The first caller for a prompt starts the generation and later ones follow
+    it, across threads (generate/stream) and across coroutines on the same
+    event loop (agenerate/astream). Streams run in their own thread or task,
+    so followers still get the whole answer if the first caller disconnects.
+
+    Only the first caller is admitted (the `admit` callable of the *_admitted
+    methods): followers cost no upstream call, so they are not charged. If the
+    first caller is refused, its followers do not share its RateLimited (it
+    may be that user's own quota) but try again, leading a new flight.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+        self.model_name = provider.model_name
+        self.flights = {}
+        self.tasks = set()
+        self.lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+
+    @property
+    def available(self):
+        return self.provider.available
+
+    def describe_error(self, e):
+        return self.provider.describe_error(e)
+
+    def is_rate_limit(self, e):
+        return self.provider.is_rate_limit(e)
+
+    def is_transient(self, e):
+        return self.provider.is_transient(e)
+
+    def key(self, prompt, mode, scope=None):
+        return (mode, scope, hashlib.sha1(prompt.encode('utf-8')).hexdigest())
+
+    def join(self, key, factory):
+        """Return (flight, is_leader) for key, registering a new flight if none is in progress"""
+        with self.lock:
+            flight = self.flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = self.flights[key] = factory()
+            self.started += 1
+            return flight, True
+
+    def land(self, key, flight):
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    def run(self, key, flight, pieces):
+        error = None
+        try:
+            for text in pieces:
+                flight.push(text)
+        except Exception as e:
+            error = e
+        finally:
+            # Land before finishing, so a follower that retries starts a new flight
+            self.land(key, flight)
+            flight.finish(error)
+
+    async def arun(self, key, flight, pieces):
+        error = None
+        try:
+            async for text in pieces:
+                await flight.push(text)
+        except Exception as e:
+            error = e
+        finally:
+            self.land(key, flight)
+            await flight.finish(error)
+
+    def generate(self, prompt, admit=None):
+        key = self.key(prompt, 'generate')
+        while True:
+            flight, leader = self.join(key, Flight)
+            if leader:
+                self.run(key, flight, self._generate_once(prompt, admit))
+            try:
+                return ''.join(flight.follow())
+            except Refused as e:
+                if leader:
+                    raise e.error
+
+    def _generate_once(self, prompt, admit):
+        if admit is not None:
+            try:
+                admit()
+            except Exception as e:
+                raise Refused(e) from e
+        yield self.provider.generate(prompt)
+
+    def stream(self, prompt, admit=None):
+        key = self.key(prompt, 'stream')
+        while True:
+            flight, leader = self.join(key, Flight)
+            if leader:
+                threading.Thread(target=self.run, args=(key, flight, self._stream_once(prompt, admit)), daemon=True).start()
+            try:
+                yield from flight.follow()
+                return
+            except Refused as e:
+                # Raised before any piece, so nothing has been yielded yet
+                if leader:
+                    raise e.error
+
+    def _stream_once(self, prompt, admit):
+        if admit is not None:
+            try:
+                admit()
+            except Exception as e:
+                raise Refused(e) from e
+        yield from self.provider.stream(prompt)
+
+    async def agenerate(self, prompt, admit=None):
+        key = self.key(prompt, 'agenerate', id(asyncio.get_running_loop()))
+        while True:
+            flight, leader = self.join(key, AsyncFlight)
+            if leader:
+                await self.arun(key, flight, self._agenerate_once(prompt, admit))
+            try:
+                return ''.join([text async for text in flight.follow()])
+            except Refused as e:
+                if leader:
+                    raise e.error
+
+    async def _agenerate_once(self, prompt, admit):
+        if admit is not None:
+            try:
+                await admit()
+            except Exception as e:
+                raise Refused(e) from e
+        yield await self.provider.agenerate(prompt)
+
+    async def astream(self, prompt, admit=None):
+        key = self.key(prompt, 'astream', id(asyncio.get_running_loop()))
+        while True:
+            flight, leader = self.join(key, AsyncFlight)
+            if leader:
+                task = asyncio.get_running_loop().create_task(self.arun(key, flight, self._astream_once(prompt, admit)))
+                # The loop only keeps weak references to tasks
+                self.tasks.add(task)
+                task.add_done_callback(self.tasks.discard)
+            try:
+                async for text in flight.follow():
+                    yield text
+                return
+            except Refused as e:
+                if leader:
+                    raise e.error
+
+    async def _astream_once(self, prompt, admit):
+        if admit is not None:
+            try:
+                await admit()
+            except Exception as e:
+                raise Refused(e) from e
+        async for text in self.provider.astream(prompt):
+            yield text
+
+    generate_admitted = generate
+    stream_admitted = stream
+    agenerate_admitted = agenerate
+    astream_admitted = astream
+
+    def stats(self):
+        return dict(
+            self.provider.stats(), in_flight=len(self.flights), started=self.started, coalesced=self.coalesced
+        )
+
+
+class ProviderUnavailable(Exception):
+    """The provider's circuit is open, so the call was not made; retry_after is a hint in seconds"""
+    status = 503
+
+    def __init__(self, name, retry_after):
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(
+            f"The {name} model is unavailable right now. Please try again in {self.retry_after} seconds."
+        )
+
+
+class CircuitBreaker:
+    """
+    Closed until `failures` calls in a row fail, then open (calls fail fast)
+    for `reset_after` seconds, then half-open: a single trial call either
+    closes it again or reopens it.
+    """
+
+    def __init__(self, failures=5, reset_after=30):
+        self.threshold = failures
+        self.reset_after = reset_after
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial = False
+        self.opened = 0
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_after:
+                self.state, self.trial = 'half_open', False
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self.trial:
+                self.trial = True
+                return True
+            return False
+
+    def retry_after(self):
+        return max(0.0, self.reset_after - (time.monotonic() - self.opened_at))
+
+    def record(self, ok):
+        """ok is True for a success, False for an outage-like failure and None for neither (e.g. a bad request)"""
+        with self.lock:
+            self.trial = False
+            if ok:
+                self.state, self.failures = 'closed', 0
+            elif ok is False:
+                self.failures += 1
+                if self.state == 'half_open' or self.failures >= self.threshold:
+                    self.state, self.opened_at = 'open', time.monotonic()
+                    self.opened += 1
+
+    def stats(self):
+        return {'state': self.state, 'consecutive_failures': self.failures, 'opened': self.opened}
+
+
+class Attempt:
+    """One call to one provider, recorded on its circuit breaker exactly once"""
+
+    def __init__(self, breaker):
+        self.breaker = breaker
+        self.started = None
+        self.settled = False
+        self.lock = threading.Lock()
+
+    def settle(self, ok):
+        with self.lock:
+            if self.settled:
+                return
+            self.settled = True
+        self.breaker.record(ok)
+
+
+class LatencyWindow:
+    """Latencies of the last `size` successful calls"""
+
+    def __init__(self, size=200):
+        self.samples = deque(maxlen=size)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def record(self, seconds):
+        self.samples.append(seconds)
+
+    def percentile(self, p):
+        samples = sorted(self.samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+
+class ResilientProvider(LLMProvider):
+    """
+    Deadlines, retries, a circuit breaker and hedging around a provider.
+
+    Each attempt gets `timeout` seconds (a stream gets `first_token_timeout`
+    for its first piece and `timeout` between pieces), all attempts together
+    `deadline` seconds. Timeouts and transient errors are retried up to
+    `retries` times after a full-jitter exponential backoff; a stream only
+    until it has produced its first piece. After `breaker_failures` such
+    failures in a row the circuit opens for `breaker_reset` seconds, during
+    which calls go to the hedge provider if there is one and otherwise fail
+    fast with ProviderUnavailable.
+
+    With a hedge provider, a generate call the primary has not answered
+    within its recent p`hedge_percentile` latency also goes to the hedge
+    provider, and the first answer wins.
+    """
+    queue_poll_interval = 0.05
+
+    def __init__(self, provider, hedge=None, timeout=30, deadline=60, first_token_timeout=15, retries=2,
+                 backoff=0.5, max_backoff=4, breaker_failures=5, breaker_reset=30, hedge_percentile=95,
+                 hedge_min_delay=1.0, hedge_min_samples=20, max_workers=32):
+        self.provider = provider
+        self.hedge = hedge
+        self.name = provider.name
+        self.model_name = provider.model_name
+        self.timeout = timeout
+        self.deadline = deadline
+        self.first_token_timeout = first_token_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self.hedge_breaker = CircuitBreaker(breaker_failures, breaker_reset) if hedge is not None else None
+        self.latency = LatencyWindow()
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix=f'llm-{self.name}')
+        self.counts = {'calls': 0, 'retries': 0, 'timeouts': 0, 'fallbacks': 0, 'hedged': 0, 'hedge_wins': 0}
+        self.lock = threading.Lock()
+
+    @property
+    def available(self):
+        return self.provider.available
+
+    def describe_error(self, e):
+        if isinstance(e, ProviderUnavailable):
+            return str(e)
+        if isinstance(e, TimeoutError):
+            return "The model took too long to answer. Please try again."
+        return self.provider.describe_error(e)
+
+    def is_rate_limit(self, e):
+        return self.provider.is_rate_limit(e)
+
+    def is_transient(self, e):
+        return self.provider.is_transient(e)
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] += 1
+
+    def outcome(self, provider, e):
+        """Breaker verdict for an exception: only outage-like errors count towards opening the circuit"""
+        return False if provider.is_transient(e) else None
+
+    def route(self):
+        """(provider, breaker) to call: the primary, or the hedge provider while the primary's circuit is open"""
+        if self.breaker.allow():
+            return self.provider, self.breaker
+        if self.hedge is not None and self.hedge_breaker.allow():
+            self.count('fallbacks')
+            return self.hedge, self.hedge_breaker
+        raise ProviderUnavailable(self.name, self.breaker.retry_after())
+
+    def retry_delay(self, e, attempt, deadline):
+        """Backoff before retry number `attempt`, or None if e should be raised instead"""
+        if attempt > self.retries or isinstance(e, ProviderUnavailable) or not self.is_transient(e):
+            return None
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+        if time.monotonic() + delay >= deadline:
+            return None
+        self.count('retries')
+        return delay
+
+    def hedge_delay(self, timeout):
+        """How long the primary gets before the backup request: its recent p95 (or so) latency"""
+        if len(self.latency) < self.hedge_min_samples:
+            return timeout / 2
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_percentile))
+
+    def timed_out(self, pending, attempts, timeout):
+        for call in pending:
+            # A call still queued for a pool thread never reached the provider
+            attempts[call].settle(None if call.cancel() else False)
+        self.count('timeouts')
+        return TimeoutError(f"{self.name} did not answer within {timeout:g}s")
+
+    def generate(self, prompt):
+        self.count('calls')
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                return self._generate_once(prompt, deadline)
+            except Exception as e:
+                attempt += 1
+                delay = self.retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    def _call(self, provider, attempt, prompt):
+        started = attempt.started = time.monotonic()
+        try:
+            answer = provider.generate(prompt)
+        except Exception as e:
+            attempt.settle(self.outcome(provider, e))
+            raise
+        if provider is self.provider:
+            self.latency.record(time.monotonic() - started)
+        attempt.settle(True)
+        return answer
+
+    def _generate_once(self, prompt, deadline):
+        provider, breaker = self.route()
+        timeout = min(self.timeout, deadline - time.monotonic())
+        attempts = {}
+
+        def submit(provider, breaker):
+            attempt = Attempt(breaker)
+            future = self.executor.submit(self._call, provider, attempt, prompt)
+            attempts[future] = attempt
+            return future
+
+        # The SDKs cannot abandon a call, so a late or losing one finishes in its pool thread
+        primary = submit(provider, breaker)
+        pending = {primary}
+        if provider is self.provider and self.hedge is not None:
+            done, pending = wait(pending, timeout=min(self.hedge_delay(timeout), timeout))
+            if not done and self.hedge_breaker.allow():
+                self.count('hedged')
+                pending.add(submit(self.hedge, self.hedge_breaker))
+            pending |= done
+        error = None
+        while pending:
+            # The timeout runs from when a call left the pool's queue, but never past the deadline
+            starts = [attempts[future].started for future in pending if attempts[future].started is not None]
+            end = min([deadline] + [started + self.timeout for started in starts])
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise self.timed_out(pending, attempts, timeout)
+            if len(starts) < len(pending):
+                # Wake up to notice a queued call starting
+                remaining = min(remaining, self.queue_poll_interval)
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self.count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def agenerate(self, prompt):
+        self.count('calls')
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            try:
+                return await self._agenerate_once(prompt, deadline)
+            except Exception as e:
+                attempt += 1
+                delay = self.retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    async def _acall(self, provider, attempt, prompt):
+        started = time.monotonic()
+        try:
+            answer = await provider.agenerate(prompt)
+        except asyncio.CancelledError:
+            attempt.settle(None)
+            raise
+        except Exception as e:
+            attempt.settle(self.outcome(provider, e))
+            raise
+        if provider is self.provider:
+            self.latency.record(time.monotonic() - started)
+        attempt.settle(True)
+        return answer
+
+    async def _agenerate_once(self, prompt, deadline):
+        provider, breaker = self.route()
+        timeout = min(self.timeout, deadline - time.monotonic())
+        end = time.monotonic() + timeout
+        attempts = {}
+
+        def submit(provider, breaker):
+            attempt = Attempt(breaker)
+            task = asyncio.ensure_future(self._acall(provider, attempt, prompt))
+            attempts[task] = attempt
+            return task
+
+        primary = submit(provider, breaker)
+        pending = {primary}
+        try:
+            if provider is self.provider and self.hedge is not None:
+                done, pending = await asyncio.wait(pending, timeout=min(self.hedge_delay(timeout), timeout))
+                if not done and self.hedge_breaker.allow():
+                    self.count('hedged')
+                    pending.add(submit(self.hedge, self.hedge_breaker))
+                pending |= done
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, timeout=max(0, end - time.monotonic()), return_when=FIRST_COMPLETED
+                )
+                if not done:
+                    raise self.timed_out(pending, attempts, timeout)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.count('hedge_wins')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Unlike threads, the losing or late coroutine can be stopped
+            for task in pending:
+                task.cancel()
+
+    def stream(self, prompt):
+        self.count('calls')
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            provider, breaker = self.route()
+            call = Attempt(breaker)
+            started = False
+            try:
+                for text in self.pump(provider.stream(prompt)):
+                    started = True
+                    yield text
+                call.settle(True)
+                return
+            except Exception as e:
+                call.settle(self.outcome(provider, e))
+                attempt += 1
+                delay = None if started else self.retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+            finally:
+                # The client went away mid-stream
+                call.settle(None)
+
+    def pump(self, pieces):
+        """Iterate pieces from a background thread, so that waiting for each one can time out"""
+        items = queue.Queue()
+        end = object()
+        stopped = threading.Event()
+
+        def run():
+            try:
+                for text in pieces:
+                    if stopped.is_set():
+                        break
+                    items.put(text)
+                else:
+                    items.put(end)
+            except Exception as e:
+                items.put(e)
+            finally:
+                # Only this thread may close the generator; closing it ends the upstream request
+                if hasattr(pieces, 'close'):
+                    pieces.close()
+
+        threading.Thread(target=run, daemon=True).start()
+        timeout = self.first_token_timeout
+        try:
+            while True:
+                try:
+                    item = items.get(timeout=timeout)
+                except queue.Empty:
+                    self.count('timeouts')
+                    raise TimeoutError(f"{self.name} sent nothing for {timeout:g}s")
+                if item is end:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+                timeout = self.timeout
+        finally:
+            # Timed out, failed or the client went away: stop at the next piece
+            stopped.set()
+
+    async def astream(self, prompt):
+        self.count('calls')
+        deadline = time.monotonic() + self.deadline
+        attempt = 0
+        while True:
+            provider, breaker = self.route()
+            call = Attempt(breaker)
+            pieces = provider.astream(prompt)
+            started = False
+            try:
+                timeout = self.first_token_timeout
+                while True:
+                    try:
+                        text = await asyncio.wait_for(pieces.__anext__(), timeout)
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.count('timeouts')
+                        raise TimeoutError(f"{self.name} sent nothing for {timeout:g}s")
+                    started = True
+                    yield text
+                    timeout = self.timeout
+                call.settle(True)
+                return
+            except Exception as e:
+                call.settle(self.outcome(provider, e))
+                attempt += 1
+                delay = None if started else self.retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+            finally:
+                call.settle(None)
+                await pieces.aclose()
+
+    def stats(self):
+        with self.lock:
+            counts = dict(self.counts)
+        p95 = self.latency.percentile(95)
+        stats = dict(counts, breaker=self.breaker.stats(), p95_ms=round(p95 * 1000) if p95 is not None else None)
+        if self.hedge is not None:
+            stats['hedge_provider'] = self.hedge.name
+            stats['hedge_breaker'] = self.hedge_breaker.stats()
+            stats['hedge_win_rate'] = round(counts['hedge_wins'] / counts['hedged'], 4) if counts['hedged'] else 0.0
+        return stats
+
+
+_providers = {}
+_providers_lock = threading.Lock()
+
+
+def build_backend(name):
+    """Instantiate the provider configured as LLM_PROVIDERS[name], without wrappers"""
+    try:
+        config = dict(settings.LLM_PROVIDERS[name])
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown LLM provider '{name}'. Choose from: {', '.join(settings.LLM_PROVIDERS)}"
+        )
+    backend = config.pop('backend')
+    return import_string(backend)(**config)
+
+
+def build_provider(name):
+    """Build LLM_PROVIDERS[name] wrapped as LLM_RESILIENCE and LLM_COALESCE say"""
+    provider = build_backend(name)
+    resilience = dict(settings.LLM_RESILIENCE)
+    if resilience.pop('enabled'):
+        hedge_name = resilience.pop('hedge_provider')
+        hedge = build_backend(hedge_name) if hedge_name and hedge_name != name else None
+        if hedge is not None and not hedge.available:
+            hedge = None
+        provider = ResilientProvider(provider, hedge, **resilience)
+    if settings.LLM_COALESCE:
+        provider = CoalescingProvider(provider)
+    return provider
+
+
+def get_provider(name=None):
+    """Return the process-wide provider named by LLM_PROVIDER (or name), building it on first use"""
+    name = name or settings.LLM_PROVIDER
+    provider = _providers.get(name)
+    if provider is None:
+        with _providers_lock:
+            provider = _providers.get(name)
+            if provider is None:
+                provider = _providers[name] = build_provider(name)
+    return provider
+
+
+def provider_stats():
+    """Single-flight, breaker, retry and hedging counters of the providers built in this process"""
+    return {name: provider.stats() for name, provider in list(_providers.items())}
+
+
+def reset_providers():
+    """Drop the cached providers so the next call rebuilds them from settings"""
+    with _providers_lock:
+        _providers.clear()
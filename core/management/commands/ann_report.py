@@ -0,0 +1,116 @@
+import json
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.search import vector
+from core.search.ann import from_exact
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Compare recall and latency of the IVF index against exact vector search'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help='Number of sample queries')
+        parser.add_argument('--k', type=int, default=10, help='Neighbours per query')
+        parser.add_argument('--nlist', type=int, default=0, help='IVF lists (0 = sqrt of corpus size)')
+        parser.add_argument('--nprobe', default='1,2,4,8,16,32', help='Comma-separated nprobe values to try')
+        parser.add_argument('--synthetic', type=int, default=0,
+                            help='Use N random clustered vectors instead of the article passages')
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        if options['synthetic']:
+            exact, queries = self.synthetic_corpus(options['synthetic'], options['queries'], rng)
+        else:
+            exact, queries = self.passage_corpus(options['queries'], rng)
+
+        if len(exact) == 0:
+            self.stdout.write(self.style.WARNING('No vectors to index.'))
+            return
+
+        k = options['k']
+        started = time.perf_counter()
+        ivf = from_exact(exact, nlist=options['nlist'] or None)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        truth, exact_ms = [], []
+        for query in queries:
+            started = time.perf_counter()
+            hits = exact.search_vector(query, k)
+            exact_ms.append((time.perf_counter() - started) * 1000)
+            truth.append({doc_id for doc_id, _ in hits})
+
+        report = {
+            'vectors': len(exact),
+            'dim': exact.dim,
+            'queries': len(queries),
+            'k': k,
+            'nlist': ivf.nlist,
+            'ivf_build_ms': round(build_ms, 1),
+            'exact': {'mean_ms': round(float(np.mean(exact_ms)), 3), 'p95_ms': round(percentile(exact_ms, 95), 3)},
+            'ivf': [],
+        }
+        for nprobe in [int(value) for value in options['nprobe'].split(',') if value.strip()]:
+            recalls, latencies = [], []
+            for query, expected in zip(queries, truth):
+                started = time.perf_counter()
+                hits = ivf.search_vector(query, k, nprobe=nprobe)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if expected:
+                    recalls.append(len(expected & {doc_id for doc_id, _ in hits}) / len(expected))
+            report['ivf'].append({
+                'nprobe': min(nprobe, ivf.nlist),
+                'recall': round(float(np.mean(recalls)) if recalls else 1.0, 4),
+                'mean_ms': round(float(np.mean(latencies)), 3),
+                'p95_ms': round(percentile(latencies, 95), 3),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(
+            f"{report['vectors']} vectors x {report['dim']} dims, {report['queries']} queries, "
+            f"k={k}, nlist={report['nlist']} (built in {report['ivf_build_ms']} ms)"
+        )
+        self.stdout.write(f"exact        recall 1.0000  mean {report['exact']['mean_ms']:8.3f} ms  "
+                          f"p95 {report['exact']['p95_ms']:8.3f} ms")
+        for row in report['ivf']:
+            self.stdout.write(f"nprobe {row['nprobe']:>4}  recall {row['recall']:.4f}  "
+                              f"mean {row['mean_ms']:8.3f} ms  p95 {row['p95_ms']:8.3f} ms")
+
+    def passage_corpus(self, n_queries, rng):
+        """Exact index over the real passages; queries are the opening words of sampled passages"""
+        from core.search.chunking import published_passages
+
+        exact = vector.build_passage_vectors()
+        texts = [text for _, _, text in published_passages()]
+        if not texts:
+            return exact, []
+        picks = rng.choice(len(texts), min(n_queries, len(texts)), replace=False)
+        # passage_text() starts with the title twice and the category; skip those lines
+        queries = [' '.join(texts[i].split('\n', 3)[-1].split()[:12]) for i in picks]
+        return exact, list(vector.embedder().embed(queries))
+
+    def synthetic_corpus(self, size, n_queries, rng):
+        """Random vectors around sqrt(size) cluster centres; queries are perturbed corpus rows"""
+        dim = settings.SEARCH_EMBEDDING_DIM
+        centres = rng.standard_normal((max(1, int(np.sqrt(size))), dim)).astype(np.float32)
+        vectors = centres[rng.integers(len(centres), size=size)]
+        vectors += 0.5 * rng.standard_normal((size, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+        exact = vector.VectorIndex(dim, capacity=size)
+        exact.add(list(range(size)), vectors)
+        picks = rng.choice(size, min(n_queries, size), replace=False)
+        queries = vectors[picks] + 0.1 * rng.standard_normal((len(picks), dim)).astype(np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        return exact, list(queries)
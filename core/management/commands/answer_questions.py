@@ -0,0 +1,176 @@
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.test import override_settings
+
+from core import admission
+from core.llm import ProviderUnavailable, get_provider
+from core.utils import get_ai_response, search_knowledge_base
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+
+def ends_mid_line(path):
+    """True if a crash left the file's last line unfinished"""
+    if not path.exists() or not path.stat().st_size:
+        return False
+    with path.open('rb') as handle:
+        handle.seek(-1, os.SEEK_END)
+        return handle.read(1) != b'\n'
+
+
+def read_jsonl(path):
+    """Yield (line number, record) for each valid JSON line; a torn last line is skipped"""
+    with path.open(encoding='utf-8') as handle:
+        for line_no, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+class Command(BaseCommand):
+    help = (
+        'Answer questions from a JSONL file offline: retrieval and generation run in a bounded '
+        'thread pool under admission control, and answers with timings are appended to a JSONL '
+        'output that a rerun resumes from'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('input', help='JSONL file with one question per line')
+        parser.add_argument('--output', required=True,
+                            help='JSONL file to append answers to; items already answered there are skipped')
+        parser.add_argument('--question-field', default='question',
+                            help='Field holding the question, e.g. "body" for requests.jsonl')
+        parser.add_argument('--id-field', default='id',
+                            help='Field identifying a question; defaults to its line number when missing')
+        parser.add_argument('--workers', type=int, default=4, help='Questions answered concurrently')
+        parser.add_argument('--limit', type=int, help='Answer at most this many new questions')
+        parser.add_argument('--requests-per-minute', type=int,
+                            help="Override LLM_ADMISSION['requests_per_minute'] for this run")
+        parser.add_argument('--tokens-per-minute', type=int,
+                            help="Override LLM_ADMISSION['tokens_per_minute'] for this run")
+        parser.add_argument('--max-attempts', type=int, default=3,
+                            help='Tries per question when the model is rate limited or unavailable')
+
+    def handle(self, *args, **options):
+        input_path, output_path = Path(options['input']), Path(options['output'])
+        if not input_path.exists():
+            raise CommandError(f'{input_path} does not exist')
+        if not get_provider().available:
+            self.stderr.write(f"LLM provider '{settings.LLM_PROVIDER}' has no API key; answers will be demo responses")
+        self.question_field = options['question_field']
+        self.id_field = options['id_field']
+        self.max_attempts = options['max_attempts']
+
+        done = self.finished_ids(output_path)
+        todo = self.pending(input_path, done, options['limit'])
+
+        limits = {key: options[key] for key in ('requests_per_minute', 'tokens_per_minute') if options[key]}
+        # A fresh admission controller with this run's limits; batch calls only use the global buckets
+        with override_settings(LLM_ADMISSION=dict(settings.LLM_ADMISSION, **limits)):
+            admission.reset_controller()
+            try:
+                results = self.run(todo, output_path, options['workers'])
+            finally:
+                admission.reset_controller()
+
+        answered = [result for result in results if result['status'] == 'ok']
+        timings = [result['total_ms'] for result in answered]
+        self.stdout.write(self.style.SUCCESS(
+            f"Answered {len(answered)}, failed {len(results) - len(answered)}, "
+            f"already done {len(done)}; p50 {percentile(timings, 50)}ms, p95 {percentile(timings, 95)}ms"
+        ))
+
+    def finished_ids(self, output_path):
+        """Ids answered successfully by earlier runs; failed items are tried again"""
+        if not output_path.exists():
+            return set()
+        return {record['id'] for _, record in read_jsonl(output_path) if record.get('status') == 'ok'}
+
+    def pending(self, input_path, done, limit):
+        """Yield the (id, question) items still to answer, streaming the input"""
+        seen = set()
+        for line_no, record in read_jsonl(input_path):
+            item_id = str(record.get(self.id_field) or f'line-{line_no}')
+            question = (record.get(self.question_field) or '').strip()
+            if item_id in done or item_id in seen or not question:
+                continue
+            if limit is not None and len(seen) >= limit:
+                return
+            seen.add(item_id)
+            yield item_id, question
+
+    def run(self, todo, output_path, workers):
+        """Answer items on a pool, at most 2 * workers in flight, appending each result as it completes"""
+        results = []
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        torn = ends_mid_line(output_path)
+        with output_path.open('a', encoding='utf-8') as out, ThreadPoolExecutor(workers) as pool:
+            if torn:
+                out.write('\n')
+            in_flight = set()
+
+            def collect(futures):
+                for future in futures:
+                    result = future.result()
+                    out.write(json.dumps(result) + '\n')
+                    out.flush()
+                    results.append(result)
+                    if len(results) % 100 == 0:
+                        self.stderr.write(f'{len(results)} done...')
+
+            try:
+                for item in todo:
+                    if len(in_flight) >= 2 * workers:
+                        finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        collect(finished)
+                    in_flight.add(pool.submit(self.answer, *item))
+                collect(wait(in_flight).done)
+            except KeyboardInterrupt:
+                # Drop what has not started; a rerun picks it up
+                for future in in_flight:
+                    future.cancel()
+                raise
+        return results
+
+    def answer(self, item_id, question):
+        """Retrieve and generate one answer; never raises, so one bad item cannot stop the run"""
+        started = time.perf_counter()
+        result = {'id': item_id, 'question': question}
+        usage = {}
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                try:
+                    context = search_knowledge_base(question, usage=usage)
+                    answer = get_ai_response(question, context, [], user=None, priority='batch', usage=usage)
+                    break
+                except (admission.RateLimited, ProviderUnavailable) as e:
+                    if attempt == self.max_attempts:
+                        raise
+                    time.sleep(e.retry_after)
+            result.update(
+                status='error' if usage.get('error') else 'ok',
+                answer=answer,
+                sources=sorted({passage['article_id'] for passage in context}),
+                attempts=attempt,
+            )
+        except Exception as e:
+            usage.setdefault('error', str(e))
+            result.update(status='error', answer=None)
+        finally:
+            close_old_connections()
+        result.update(usage)
+        result['total_ms'] = round((time.perf_counter() - started) * 1000, 3)
+        return result
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import AsyncRequestFactory, RequestFactory, override_settings
+
+from core import async_views, views
+from core.llm import reset_providers
+from core.models import Conversation
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare how many concurrent chats the sync views (one request per WSGI worker) '
+        'and the async views (one ASGI event loop) get through while waiting on the model'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Concurrent chat requests per mode')
+        parser.add_argument('--latency', type=float, default=1.0, help='Fake provider response time (seconds)')
+        parser.add_argument('--workers', type=int, default=4,
+                            help='Sync WSGI workers, e.g. gunicorn --workers (simulated with threads)')
+        parser.add_argument('--modes', default='sync,async', help='Comma-separated modes to run')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_chat needs the SQLite backend (it runs on a throwaway database)')
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = [mode for mode in modes if mode not in ('sync', 'async')]
+        if unknown:
+            raise CommandError(f"Unknown mode(s): {', '.join(unknown)}")
+
+        # A file rather than :memory: so the sync workers' threads share one database
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict['TEST']['NAME'] = path
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Every request goes through the real chat path, answered by the offline fake provider.
+        # The requests ask the same question, so answer caching and coalescing are off to
+        # measure one model call per chat, and admission control is off so none are shed.
+        fake = dict(settings.LLM_PROVIDERS['fake'], latency=options['latency'], token_delay=0.0)
+        overrides = override_settings(
+            LLM_PROVIDER='fake', LLM_PROVIDERS={**settings.LLM_PROVIDERS, 'fake': fake}, LLM_COALESCE=False,
+            ANSWER_CACHE=dict(settings.ANSWER_CACHE, enabled=False),
+            LLM_ADMISSION=dict(settings.LLM_ADMISSION, enabled=False),
+        )
+        overrides.enable()
+        reset_providers()
+        try:
+            self.user = User.objects.create_user('bench', password='bench')
+            report = {
+                'requests': options['requests'],
+                'latency_s': options['latency'],
+                'workers': options['workers'],
+                'modes': {},
+            }
+            for mode in modes:
+                self.stderr.write(f'{mode}...')
+                conversations = [
+                    Conversation.objects.create(user=self.user).id for _ in range(options['requests'])
+                ]
+                run = self.run_sync if mode == 'sync' else self.run_async
+                report['modes'][mode] = run(conversations, options)
+        finally:
+            overrides.disable()
+            reset_providers()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def summarize(self, started, finished, statuses):
+        """Latency runs from when the whole batch was submitted, so it includes queueing for a worker"""
+        wall = time.perf_counter() - started
+        latencies = [(at - started) * 1000 for at in finished]
+        return {
+            'wall_s': round(wall, 3),
+            'throughput_rps': round(len(latencies) / wall, 2),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'errors': sum(1 for status in statuses if status != 200),
+        }
+
+    def run_sync(self, conversations, options):
+        factory = RequestFactory()
+
+        def one(conversation_id):
+            request = factory.post('/api/message/send/', json.dumps({
+                'conversation_id': conversation_id, 'message': 'How do I reset my password?',
+            }), content_type='application/json')
+            request.user = self.user
+            try:
+                response = views.send_message(request)
+            finally:
+                connections.close_all()
+            return time.perf_counter(), response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            results = list(pool.map(one, conversations))
+        finished, statuses = zip(*results)
+        return self.summarize(started, finished, statuses)
+
+    def run_async(self, conversations, options):
+        factory = AsyncRequestFactory()
+
+        async def one(conversation_id):
+            request = factory.post('/api/message/send/', json.dumps({
+                'conversation_id': conversation_id, 'message': 'How do I reset my password?',
+            }), content_type='application/json')
+            request.user = self.user
+            response = await async_views.send_message(request)
+            return time.perf_counter(), response.status_code
+
+        async def run_all():
+            return await asyncio.gather(*[one(conversation_id) for conversation_id in conversations])
+
+        started = time.perf_counter()
+        results = asyncio.run(run_all())
+        finished, statuses = zip(*results)
+        return self.summarize(started, finished, statuses)
@@ -0,0 +1,289 @@
+import json
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.models import Article, ArticleChunk, Category
+from core.search import bm25, vector
+from core.search.backends import BACKENDS
+from core.search.chunking import build_chunks
+from core.search.ranking import hybrid_search
+
+CONSONANTS = 'bcdfghjklmnprstvz'
+VOWELS = 'aeiou'
+SYLLABLES = [c + v for c in CONSONANTS for v in VOWELS]
+WORD_SPACE = len(SYLLABLES) ** 4
+COMMON_WORDS = 300
+TOPIC_WORDS = 30
+BODY_WORDS = 80
+
+
+def word(n):
+    """Map an integer to a distinct four-syllable pseudo-word"""
+    n = (n * 2654435761 + 12345) % WORD_SPACE
+    parts = []
+    for _ in range(4):
+        n, digit = divmod(n, len(SYLLABLES))
+        parts.append(SYLLABLES[digit])
+    return ''.join(parts)
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else 0.0
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class SyntheticCorpus:
+    """
+    Seeded articles with known answers.
+
+    Every article belongs to a topic (its category) and draws its body from a
+    shared pool of common words and its topic's words. It also carries two
+    signature words no other article uses: one in the title and body, one in
+    the body only. Each query targets one article through one of its
+    signature words plus topic words, so the relevant article is known.
+    """
+
+    def __init__(self, size, seed=0):
+        self.size = size
+        self.seed = seed
+        self.topics = max(10, int(np.sqrt(size)))
+        self.common = [word(i) for i in range(COMMON_WORDS)]
+        self.topic_words = [
+            [word(COMMON_WORDS + t * TOPIC_WORDS + j) for j in range(TOPIC_WORDS)]
+            for t in range(self.topics)
+        ]
+        self.signature_base = COMMON_WORDS + self.topics * TOPIC_WORDS
+
+    def topic_of(self, i):
+        return i % self.topics
+
+    def signatures(self, i):
+        return word(self.signature_base + 2 * i), word(self.signature_base + 2 * i + 1)
+
+    def category_names(self):
+        return [f'{words[0].title()} {words[1].title()}' for words in self.topic_words]
+
+    def articles(self, start, stop):
+        """Yield (index, title, content) for articles in [start, stop)"""
+        rng = np.random.default_rng((self.seed, start))
+        common_picks = rng.integers(COMMON_WORDS, size=(stop - start, BODY_WORDS // 2))
+        topic_picks = rng.integers(TOPIC_WORDS, size=(stop - start, BODY_WORDS // 2 - 4))
+        for offset, i in enumerate(range(start, stop)):
+            topic = self.topic_words[self.topic_of(i)]
+            title_word, body_word = self.signatures(i)
+            words = [self.common[j] for j in common_picks[offset]]
+            words += [topic[j] for j in topic_picks[offset]]
+            words += [title_word, title_word, body_word, body_word]
+            rng.shuffle(words)
+            title = f'{title_word.title()} {topic[topic_picks[offset][0]]} {topic[topic_picks[offset][1]]}'
+            yield i, title, ' '.join(words) + '.'
+
+    def queries(self, count):
+        """Return (query, relevant article indexes) pairs, alternating title and body targets"""
+        rng = np.random.default_rng((self.seed, self.size, count))
+        targets = rng.choice(self.size, min(count, self.size), replace=False)
+        queries = []
+        for n, i in enumerate(targets):
+            topic = self.topic_words[self.topic_of(int(i))]
+            title_word, body_word = self.signatures(int(i))
+            extra = [topic[j] for j in rng.choice(TOPIC_WORDS, 2, replace=False)]
+            if n % 2:
+                terms = [body_word, extra[0], self.common[int(rng.integers(COMMON_WORDS))]]
+            else:
+                terms = [title_word] + extra
+            rng.shuffle(terms)
+            queries.append((' '.join(terms), {int(i)}))
+        return queries
+
+
+class Command(BaseCommand):
+    help = 'Benchmark latency, memory, build time and recall of every search backend on a synthetic corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000', help='Comma-separated corpus sizes, e.g. 1000,100000')
+        parser.add_argument('--queries', type=int, default=200, help='Number of seeded queries')
+        parser.add_argument('--k', type=int, default=10, help='Results per query')
+        parser.add_argument('--backends', default=','.join(list(BACKENDS) + ['hybrid']),
+                            help='Comma-separated backends to run')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000, help='Articles inserted per transaction')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('bench_search needs the SQLite backend (it runs on an in-memory database)')
+        backends = [name.strip() for name in options['backends'].split(',') if name.strip()]
+        unknown = [name for name in backends if name not in BACKENDS and name != 'hybrid']
+        if unknown:
+            raise CommandError(f"Unknown backend(s): {', '.join(unknown)}")
+
+        report = {
+            'revision': git_revision(),
+            'k': options['k'],
+            'seed': options['seed'],
+            'settings': {
+                'embedder': settings.SEARCH_EMBEDDER,
+                'embedding_dim': settings.SEARCH_EMBEDDING_DIM,
+                'ann': settings.SEARCH_ANN,
+                'ranking': settings.SEARCH_RANKING,
+                'chunk_words': settings.SEARCH_CHUNK_WORDS,
+            },
+            'runs': [],
+        }
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            for size in [int(value) for value in options['sizes'].split(',') if value.strip()]:
+                call_command('flush', interactive=False, verbosity=0)
+                report['runs'].append(self.run(size, backends, options))
+        finally:
+            bm25.reset_passage_index()
+            vector.reset_passage_vectors()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as handle:
+                handle.write(output + '\n')
+            self.stderr.write(f"Wrote {options['output']}")
+        else:
+            self.stdout.write(output)
+
+    def run(self, size, backends, options):
+        corpus = SyntheticCorpus(size, options['seed'])
+        self.stderr.write(f'Loading {size} articles...')
+        started = time.perf_counter()
+        article_ids = self.load(corpus, options['batch_size'])
+        load_ms = (time.perf_counter() - started) * 1000
+        chunk_articles = dict(ArticleChunk.objects.values_list('id', 'article_id').iterator(chunk_size=10000))
+
+        queries = [
+            (text, {article_ids[i] for i in relevant})
+            for text, relevant in corpus.queries(options['queries'])
+        ]
+        bm25.reset_passage_index()
+        vector.reset_passage_vectors()
+        builds = {
+            'bm25': (bm25.get_passage_index, bm25.reset_passage_index),
+            'fts': (self.rebuild_fts, lambda: None),
+            'vector': (vector.get_passage_vectors, vector.reset_passage_vectors),
+        }
+
+        run = {
+            'articles': size,
+            'passages': len(chunk_articles),
+            'queries': len(queries),
+            'load_ms': round(load_ms, 1),
+            'backends': {},
+        }
+        for name in backends:
+            self.stderr.write(f'  {name}...')
+            result = {}
+            if name in builds:
+                result.update(self.measure_build(*builds[name]))
+            if name == 'vector':
+                result['index'] = type(vector.get_passage_vectors()).__name__
+            search = hybrid_search if name == 'hybrid' else BACKENDS[name]
+            result.update(self.measure_queries(search, queries, chunk_articles, options['k']))
+            run['backends'][name] = result
+        run['peak_rss_mb'] = peak_rss_mb()
+        return run
+
+    def load(self, corpus, batch_size):
+        """Insert the corpus with bulk_create and return article ids by corpus index"""
+        author = User.objects.create(username='bench')
+        Category.objects.bulk_create([
+            Category(name=name, slug=f'topic-{t}') for t, name in enumerate(corpus.category_names())
+        ])
+        categories = dict(Category.objects.values_list('slug', 'id'))
+
+        article_ids = {}
+        for start in range(0, corpus.size, batch_size):
+            articles = [
+                Article(
+                    title=title, slug=f'article-{i}', category_id=categories[f'topic-{corpus.topic_of(i)}'],
+                    description=content[:300], content=content, author=author, read_time=1,
+                )
+                for i, title, content in corpus.articles(start, min(start + batch_size, corpus.size))
+            ]
+            with transaction.atomic():
+                created = Article.objects.bulk_create(articles)
+                chunks = []
+                for article in created:
+                    chunks.extend(build_chunks(article))
+                ArticleChunk.objects.bulk_create(chunks, batch_size=1000)
+            for offset, article in enumerate(created):
+                article_ids[start + offset] = article.id
+        return article_ids
+
+    def rebuild_fts(self):
+        with connection.cursor() as cursor:
+            cursor.execute("INSERT INTO core_articlechunk_fts(core_articlechunk_fts) VALUES('rebuild')")
+
+    def measure_build(self, build, reset):
+        """
+        Peak traced Python/numpy allocation of one index build, then the wall
+        time of a second, untraced build (tracing slows allocation-heavy code)
+        """
+        tracemalloc.start()
+        build()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        reset()
+
+        started = time.perf_counter()
+        build()
+        build_ms = (time.perf_counter() - started) * 1000
+        return {'build_ms': round(build_ms, 1), 'build_peak_mb': round(peak / (1024 * 1024), 1)}
+
+    def measure_queries(self, search, queries, chunk_articles, k):
+        """Latency percentiles plus recall@k and MRR at the article level"""
+        for text, _ in queries[:5]:
+            search(text, k)
+
+        latencies, recalls, reciprocal_ranks = [], [], []
+        for text, relevant in queries:
+            started = time.perf_counter()
+            hits = list(search(text, k))
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            ranked = []
+            for chunk_id, _ in hits:
+                article_id = chunk_articles.get(chunk_id)
+                if article_id is not None and article_id not in ranked:
+                    ranked.append(article_id)
+            recalls.append(len(relevant & set(ranked[:k])) / len(relevant))
+            rank = next((n for n, article_id in enumerate(ranked, start=1) if article_id in relevant), None)
+            reciprocal_ranks.append(1 / rank if rank else 0.0)
+
+        return {
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            f'recall@{k}': round(float(np.mean(recalls)), 4) if recalls else 0.0,
+            'mrr': round(float(np.mean(reciprocal_ranks)), 4) if reciprocal_ranks else 0.0,
+        }
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from core.search import related
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related-articles table for every published article'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=None, help='Related articles per article')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = related.compute_all(top_n=options['top'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Computed related articles for {count} article(s) in {elapsed:.1f}s'))
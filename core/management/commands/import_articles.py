@@ -0,0 +1,230 @@
+import json
+import math
+import os
+import time
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.text import slugify
+
+from core.models import Article, ArticleChunk, Category
+from core.search import related
+from core.search.chunking import build_chunks
+from core.search.indexing import reindex_articles
+
+# unique_slugs looks up this many candidate slugs per base at a time
+SLUG_WINDOW = 10
+# Candidate slugs per query, to stay under the database's parameter limit
+SLUG_QUERY_SIZE = 900
+
+TRUE_VALUES = frozenset({'true', 'yes', 'on', '1'})
+FALSE_VALUES = frozenset({'false', 'no', 'off', '0'})
+
+
+def parse_markdown(path):
+    """Read a Markdown file with optional 'key: value' front matter into an article dict"""
+    text = path.read_text(encoding='utf-8')
+    meta = {}
+    if text.startswith('---\n'):
+        end = text.find('\n---', 4)
+        if end != -1:
+            for line in text[4:end].splitlines():
+                key, sep, value = line.partition(':')
+                if sep:
+                    meta[key.strip().lower()] = value.strip().strip('"\'')
+            text = text[end + 4:].lstrip('\n')
+
+    if 'title' not in meta:
+        first_line = text.split('\n', 1)[0]
+        if first_line.startswith('# '):
+            meta['title'] = first_line[2:].strip()
+            text = text[len(first_line):].lstrip('\n')
+        else:
+            meta['title'] = path.stem.replace('-', ' ').replace('_', ' ').title()
+    meta.setdefault('category', path.parent.name)
+    meta['content'] = text
+    return meta
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import articles from JSONL files and/or directories of Markdown files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='.jsonl files or directories of .md files')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--author', help='Username of the author (default: first superuser)')
+        parser.add_argument('--category', help='Category for records that do not name one')
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help='Skip records whose category does not exist instead of creating it')
+        parser.add_argument('--skip-related', action='store_true',
+                            help='Do not rebuild the related-articles table at the end')
+
+    def handle(self, *args, **options):
+        self.author = self.get_author(options['author'])
+        self.default_category = options['category']
+        self.create_categories = not options['no_create_categories']
+        self.categories = dict(Category.objects.values_list('slug', 'id'))
+        batch_size = options['batch_size']
+
+        started = time.perf_counter()
+        imported = skipped = 0
+        batch = []
+        for record in self.records(options['paths']):
+            article = self.build_article(record)
+            if article is None:
+                skipped += 1
+                continue
+            batch.append(article)
+            if len(batch) == batch_size:
+                imported += self.save_batch(batch)
+                batch = []
+                self.stdout.write(f'{imported} imported...')
+        if batch:
+            imported += self.save_batch(batch)
+
+        if imported and not options['skip_related']:
+            self.stdout.write('Rebuilding related articles...')
+            related.compute_all()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} article(s), skipped {skipped} in {elapsed:.1f}s'
+        ))
+
+    def get_author(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'User "{username}" does not exist')
+        author = User.objects.filter(is_superuser=True).order_by('id').first()
+        if author is None:
+            raise CommandError('No superuser found; pass --author')
+        return author
+
+    def records(self, paths):
+        """Yield one article dict at a time so memory stays bounded"""
+        for path in map(Path, paths):
+            if path.is_dir():
+                for root, dirs, files in os.walk(path):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if name.endswith(('.md', '.markdown')):
+                            yield parse_markdown(Path(root) / name)
+            elif path.suffix == '.jsonl':
+                with path.open(encoding='utf-8') as handle:
+                    for line_no, line in enumerate(handle, start=1):
+                        if not line.strip():
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError as e:
+                            self.stderr.write(f'{path}:{line_no}: invalid JSON ({e})')
+                            continue
+                        if not isinstance(record, dict):
+                            self.stderr.write(f'{path}:{line_no}: not a JSON object')
+                            continue
+                        yield record
+            elif path.suffix in ('.md', '.markdown'):
+                yield parse_markdown(path)
+            else:
+                raise CommandError(f'Unsupported input: {path}')
+
+    def category_id(self, name):
+        slug = slugify(name or '')
+        if not slug:
+            return None
+        if slug not in self.categories and self.create_categories:
+            category, _ = Category.objects.get_or_create(slug=slug, defaults={'name': name})
+            self.categories[slug] = category.id
+        return self.categories.get(slug)
+
+    def build_article(self, record):
+        title = (record.get('title') or '').strip()
+        content = record.get('content') or ''
+        category_id = self.category_id(record.get('category') or self.default_category)
+        if not title or not content.strip() or category_id is None:
+            return None
+        return Article(
+            title=title[:200],
+            slug=slugify(record.get('slug') or title)[:50],
+            category_id=category_id,
+            description=record.get('description') or content[:300],
+            content=content,
+            author=self.author,
+            read_time=self.read_time(record.get('read_time'), content),
+            is_published=self.flag(record.get('is_published'), default=True),
+        )
+
+    def flag(self, value, default):
+        """A record's boolean: JSON true/false, or a string such as "false" or "yes" from front matter"""
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, (int, float)):
+            return bool(value)
+        if isinstance(value, str):
+            value = value.strip().lower()
+            if value in TRUE_VALUES:
+                return True
+            if value in FALSE_VALUES:
+                return False
+        return default
+
+    def read_time(self, value, content):
+        """Minutes to read: the record's value if it is a positive whole number, else ~200 words a minute"""
+        try:
+            minutes = int(value)
+        except (TypeError, ValueError):
+            minutes = 0
+        return minutes if minutes > 0 else max(1, math.ceil(len(content.split()) / 200))
+
+    @staticmethod
+    def suffixed(base, n):
+        """The n-th slug tried for base: base itself, then base-2, base-3, ..."""
+        if n == 1:
+            return base
+        suffix = f'-{n}'
+        return base[:50 - len(suffix)] + suffix
+
+    def unique_slugs(self, articles):
+        """Suffix slugs that clash with existing articles or with each other"""
+        taken = set()
+        looked_up = {}  # base -> candidates checked so far
+
+        def look_up(bases):
+            # Exact matches on the unique slug index, SLUG_WINDOW more candidates per base
+            candidates = []
+            for base in bases:
+                start = looked_up.get(base, 0) + 1
+                candidates.extend(self.suffixed(base, n) for n in range(start, start + SLUG_WINDOW))
+                looked_up[base] = start + SLUG_WINDOW - 1
+            for start in range(0, len(candidates), SLUG_QUERY_SIZE):
+                taken.update(
+                    Article.objects.filter(slug__in=candidates[start:start + SLUG_QUERY_SIZE])
+                    .values_list('slug', flat=True)
+                )
+
+        look_up({article.slug or 'article' for article in articles})
+        for article in articles:
+            base = article.slug or 'article'
+            n = 1
+            while self.suffixed(base, n) in taken:
+                n += 1
+                if n > looked_up[base]:
+                    look_up([base])
+            article.slug = self.suffixed(base, n)
+            taken.add(article.slug)
+
+    def save_batch(self, articles):
+        """Insert a batch of articles and their passages, then index them once"""
+        self.unique_slugs(articles)
+        with transaction.atomic():
+            created = Article.objects.bulk_create(articles)
+            chunks = []
+            for article in created:
+                chunks.extend(build_chunks(article))
+            ArticleChunk.objects.bulk_create(chunks, batch_size=1000)
+        reindex_articles([article.id for article in created], update_related=False)
+        return len(created)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from core.models import Article
+from core.search.chunking import chunk_article
+
+
+class Command(BaseCommand):
+    help = 'Re-split every article into search passages (run after changing chunk settings)'
+
+    def handle(self, *args, **kwargs):
+        rewritten = 0
+        for article in Article.objects.only('id', 'title', 'content').iterator(chunk_size=500):
+            if chunk_article(article):
+                rewritten += 1
+        self.stdout.write(self.style.SUCCESS(f'Re-chunked {rewritten} article(s)'))
@@ -0,0 +1,29 @@
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run chat answer workers against the ChatJob queue (for CHAT_QUEUE with autostart off)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Worker threads (default: CHAT_QUEUE["workers"])')
+
+    def handle(self, *args, **options):
+        count = options['workers'] or settings.CHAT_QUEUE['workers']
+        stop = threading.Event()
+        threads = jobs.start_workers(count, stop)
+        self.stdout.write(self.style.SUCCESS(f'Started {len(threads)} chat worker(s); Ctrl+C to stop'))
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+        except KeyboardInterrupt:
+            stop.set()
+            self.stdout.write('Stopping after the current jobs...')
+            for thread in threads:
+                thread.join()
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+# External-content FTS5 index over core_article. The triggers keep it in sync
+# with every insert, update and delete, including raw queryset.update() calls.
+# Note: SQLite table rebuilds (e.g. AlterField on Article) drop these triggers,
+# so any such migration must re-run FORWARD_SQL.
+FORWARD_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_article_fts USING fts5(
+        title, description, content,
+        content='core_article', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_article_fts_ai AFTER INSERT ON core_article BEGIN
+        INSERT INTO core_article_fts(rowid, title, description, content)
+        VALUES (new.id, new.title, new.description, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_article_fts_ad AFTER DELETE ON core_article BEGIN
+        INSERT INTO core_article_fts(core_article_fts, rowid, title, description, content)
+        VALUES ('delete', old.id, old.title, old.description, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_article_fts_au AFTER UPDATE OF title, description, content ON core_article BEGIN
+        INSERT INTO core_article_fts(core_article_fts, rowid, title, description, content)
+        VALUES ('delete', old.id, old.title, old.description, old.content);
+        INSERT INTO core_article_fts(rowid, title, description, content)
+        VALUES (new.id, new.title, new.description, new.content);
+    END
+    """,
+    "INSERT INTO core_article_fts(core_article_fts) VALUES ('rebuild')",
+]
+
+REVERSE_SQL = [
+    "DROP TRIGGER IF EXISTS core_article_fts_au",
+    "DROP TRIGGER IF EXISTS core_article_fts_ad",
+    "DROP TRIGGER IF EXISTS core_article_fts_ai",
+    "DROP TABLE IF EXISTS core_article_fts",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        # FTS5 is SQLite only; other databases keep the icontains fallback
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_emailotp'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_statements(FORWARD_SQL), run_statements(REVERSE_SQL)),
+    ]
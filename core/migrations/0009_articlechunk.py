@@ -0,0 +1,91 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# FTS5 index over chunk passages, maintained by triggers like core_article_fts
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS core_articlechunk_fts USING fts5(
+        title, text,
+        content='core_articlechunk', content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_articlechunk_fts_ai AFTER INSERT ON core_articlechunk BEGIN
+        INSERT INTO core_articlechunk_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_articlechunk_fts_ad AFTER DELETE ON core_articlechunk BEGIN
+        INSERT INTO core_articlechunk_fts(core_articlechunk_fts, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_articlechunk_fts_au AFTER UPDATE OF title, text ON core_articlechunk BEGIN
+        INSERT INTO core_articlechunk_fts(core_articlechunk_fts, rowid, title, text)
+        VALUES ('delete', old.id, old.title, old.text);
+        INSERT INTO core_articlechunk_fts(rowid, title, text) VALUES (new.id, new.title, new.text);
+    END
+    """,
+]
+
+DROP_FTS_SQL = [
+    "DROP TRIGGER IF EXISTS core_articlechunk_fts_au",
+    "DROP TRIGGER IF EXISTS core_articlechunk_fts_ad",
+    "DROP TRIGGER IF EXISTS core_articlechunk_fts_ai",
+    "DROP TABLE IF EXISTS core_articlechunk_fts",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+def chunk_existing_articles(apps, schema_editor):
+    from core.search.chunking import chunk_text
+
+    Article = apps.get_model('core', 'Article')
+    ArticleChunk = apps.get_model('core', 'ArticleChunk')
+    for article in Article.objects.only('id', 'title', 'content').iterator(chunk_size=500):
+        ArticleChunk.objects.bulk_create([
+            ArticleChunk(article=article, position=position, title=article.title, text=text, start=start)
+            for position, (start, text) in enumerate(chunk_text(article.content))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_article_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArticleChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('position', models.PositiveIntegerField()),
+                ('title', models.CharField(max_length=200)),
+                ('text', models.TextField()),
+                ('start', models.PositiveIntegerField(default=0)),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='core.article')),
+            ],
+            options={
+                'ordering': ['article', 'position'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='articlechunk',
+            constraint=models.UniqueConstraint(fields=('article', 'position'), name='unique_article_chunk_position'),
+        ),
+        migrations.RunPython(run_statements(FTS_SQL), run_statements(DROP_FTS_SQL)),
+        migrations.RunPython(chunk_existing_articles, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_articlechunk'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='article',
+            index=models.Index(fields=['is_published', '-created_at', 'id'], name='article_listing_idx'),
+        ),
+    ]
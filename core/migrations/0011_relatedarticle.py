@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_article_listing_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedArticle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('article', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_links', to='core.article')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.article')),
+            ],
+            options={
+                'ordering': ['article', 'rank'],
+                'indexes': [models.Index(fields=['related'], name='related_article_related_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='relatedarticle',
+            constraint=models.UniqueConstraint(fields=('article', 'rank'), name='unique_related_article_rank'),
+        ),
+    ]
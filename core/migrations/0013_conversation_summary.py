@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_chatjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='summarized_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='summary',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0013_conversation_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('prompt_tokens', models.PositiveIntegerField(default=0)),
+                ('completion_tokens', models.PositiveIntegerField(default=0)),
+                ('retrieval_ms', models.FloatField(default=0)),
+                ('generation_ms', models.FloatField(default=0)),
+                ('answer_cache_hit', models.BooleanField(default=False)),
+                ('search_cache_hit', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='usage', to='core.message')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='message_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['created_at'], name='usage_created_idx'), models.Index(fields=['user', 'created_at'], name='usage_user_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_messageusage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatjob',
+            name='deferrals',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+    ]
@@ -41,6 +41,10 @@ class Article(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination of the knowledge base listing
+            models.Index(fields=['is_published', '-created_at', 'id'], name='article_listing_idx'),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -50,10 +54,50 @@ class Article(models.Model):
     def __str__(self):
         return self.title
 
+class ArticleChunk(models.Model):
+    """Overlapping passage of an article's content, used for chat retrieval"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='chunks')
+    position = models.PositiveIntegerField()
+    title = models.CharField(max_length=200)  # article title when chunked, indexed with the text
+    text = models.TextField()
+    start = models.PositiveIntegerField(default=0)  # character offset in article.content
+    
+    class Meta:
+        ordering = ['article', 'position']
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'position'], name='unique_article_chunk_position'),
+        ]
+    
+    def __str__(self):
+        return f"{self.title} #{self.position}"
+
+class RelatedArticle(models.Model):
+    """Precomputed content-similar article, ranked per article"""
+    article = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='related_links')
+    related = models.ForeignKey(Article, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    
+    class Meta:
+        ordering = ['article', 'rank']
+        constraints = [
+            models.UniqueConstraint(fields=['article', 'rank'], name='unique_related_article_rank'),
+        ]
+        indexes = [
+            # Finding the rows that list a changed article
+            models.Index(fields=['related'], name='related_article_related_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.article_id} -> {self.related_id} ({self.score:.3f})"
+
 class Conversation(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations')
     title = models.CharField(max_length=200, default='New Conversation')
     preview = models.TextField(blank=True)
+    # Rolling summary of the messages up to summarized_until, kept by core/summaries.py
+    summary = models.TextField(blank=True)
+    summarized_until = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -83,6 +127,63 @@ class Message(models.Model):
     def __str__(self):
         return f"{self.role}: {self.content[:50]}"
 
+class ChatJob(models.Model):
+    """An assistant answer waiting to be generated by a background worker (see core/jobs.py)"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='jobs')
+    user_message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='+')
+    ai_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    error = models.TextField(blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Times the job was handed back because of a rate limit or provider outage
+    deferrals = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            # Workers claim the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='chat_job_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Job {self.id} ({self.status})"
+
+class MessageUsage(models.Model):
+    """Token, latency and cache accounting for one assistant reply, written in batches by core/usage.py"""
+    message = models.OneToOneField(Message, on_delete=models.CASCADE, related_name='usage')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='message_usage')
+    model = models.CharField(max_length=100, blank=True)
+    # Estimated with core.prompts.estimate_tokens; zero when the model was not called
+    prompt_tokens = models.PositiveIntegerField(default=0)
+    completion_tokens = models.PositiveIntegerField(default=0)
+    retrieval_ms = models.FloatField(default=0)
+    generation_ms = models.FloatField(default=0)
+    answer_cache_hit = models.BooleanField(default=False)
+    search_cache_hit = models.BooleanField(default=False)
+    # Set when the reply is recorded, not when its buffered row is written
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='usage_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='usage_user_created_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Usage of message {self.message_id}"
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     bio = models.TextField(blank=True)
@@ -0,0 +1,70 @@
+import base64
+import json
+from datetime import datetime
+
+from django.db.models import Q
+
+
+def encode_cursor(payload):
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """Decode a cursor from encode_cursor; returns None if it is missing or invalid"""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    Return (items, next_cursor) ordered by (-created_at, id).
+
+    The cursor holds the (created_at, id) of the last row served, so each page
+    is an indexed range scan that starts where the previous one stopped,
+    however deep into the listing it is.
+    """
+    queryset = queryset.order_by('-created_at', 'id')
+    payload = decode_cursor(cursor)
+    if payload and 'c' in payload and 'i' in payload:
+        try:
+            created_at = datetime.fromisoformat(payload['c'])
+            last_id = int(payload['i'])
+        except (TypeError, ValueError):
+            pass
+        else:
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__gt=last_id)
+            )
+
+    items = list(queryset[:page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+    items = items[:page_size]
+    last = items[-1]
+    return items, encode_cursor({'c': last.created_at.isoformat(), 'i': last.id})
+
+
+def ranked_page(queryset, cursor, page_size):
+    """
+    Return (items, next_cursor) for an already ranked queryset.
+
+    Search results are capped at SEARCH_MAX_RESULTS, so the cursor can simply
+    hold the position in the ranking.
+    """
+    payload = decode_cursor(cursor) or {}
+    try:
+        offset = max(int(payload.get('o', 0)), 0)
+    except (TypeError, ValueError):
+        offset = 0
+
+    items = list(queryset[offset:offset + page_size + 1])
+    if len(items) <= page_size:
+        return items, None
+    return items[:page_size], encode_cursor({'o': offset + page_size})
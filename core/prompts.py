@@ -0,0 +1,185 @@
+import math
+import re
+
+from django.conf import settings
+
+# Gemini and GPT tokenizers average roughly four characters of English per token
+CHARS_PER_TOKEN = 4
+
+SENTENCE_END_RE = re.compile(r'[.!?](?=\s|$)|\n\s*\n')
+
+# A passage trimmed below this many characters is not worth its header
+MIN_PASSAGE_CHARS = 80
+
+
+def estimate_tokens(text):
+    """Cheap, offline token estimate used for prompt budgeting"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+class PackedContext:
+    """Knowledge base context that fits a token budget"""
+
+    def __init__(self, text, passages, tokens, dropped):
+        self.text = text
+        self.passages = passages
+        self.tokens = tokens
+        self.dropped = dropped
+
+    def __str__(self):
+        return self.text
+
+    def __bool__(self):
+        return bool(self.text)
+
+    def __repr__(self):
+        return f"<PackedContext {len(self.passages)} passages, {self.tokens} tokens, {self.dropped} dropped>"
+
+
+def format_passage(title, text):
+    return f"\n\nArticle: {title}\n{text}" if title else f"\n\n{text}"
+
+
+def trim_to_sentences(text, max_chars):
+    """Longest prefix of text ending on a sentence boundary within max_chars"""
+    if len(text) <= max_chars:
+        return text
+    cut = 0
+    for match in SENTENCE_END_RE.finditer(text, 0, max_chars):
+        cut = match.end()
+    return text[:cut].rstrip()
+
+
+def tidy_edges(text, starts_mid_article):
+    """
+    Drop the sentence fragments that word-window chunking leaves at either end,
+    as long as at least half of the passage survives. Returns (skipped, text),
+    skipped being how many characters were cut from the front.
+    """
+    keep = len(text) // 2
+    skipped = 0
+    if starts_mid_article:
+        first = SENTENCE_END_RE.search(text)
+        if first and len(text) - first.end() >= keep:
+            rest = text[first.end():]
+            text = rest.lstrip()
+            skipped = first.end() + len(rest) - len(text)
+    trimmed = trim_to_sentences(text, len(text) - 1)
+    if not SENTENCE_END_RE.search(text[-1:]) and len(trimmed) >= keep:
+        text = trimmed
+    return skipped, text
+
+
+def remove_overlap(passage, spans):
+    """
+    Clip the part of a passage already covered by an accepted passage of the same
+    article. Neighbouring chunks only overlap at their edges, so what is left is
+    one contiguous slice; returns (start, text) or None if nothing new is left,
+    start being the article offset of the returned text.
+    """
+    start = passage.get('start')
+    text = passage['text']
+    if start is None:
+        return start, text
+    end = start + len(text)
+    for other_start, other_end in spans.get(passage.get('article_id'), ()):
+        if other_start >= end or other_end <= start:
+            continue
+        if other_start <= start and other_end >= end:
+            return None
+        if other_start <= start:
+            text = text[other_end - start:]
+            start = other_end
+        elif other_end >= end:
+            text = text[:other_start - start]
+            end = other_start
+        else:
+            # Only the leading part is kept when an accepted span sits inside
+            text = text[:other_start - start]
+            end = other_start
+    stripped = text.lstrip()
+    return start + len(text) - len(stripped), stripped.rstrip()
+
+
+def pack_context(passages, budget):
+    """
+    Greedily fill up to `budget` tokens with ranked passages, best first.
+
+    Passages are dicts with 'text' and optionally 'title', 'article_id' and
+    'start' (character offset in the article). Text already covered by a
+    higher-ranked passage of the same article is skipped, and a passage that
+    does not fit whole is cut at the last sentence boundary that does. The
+    returned PackedContext reports the estimated tokens used.
+    """
+    parts, used, spans = [], [], {}
+    tokens = dropped = 0
+
+    for passage in passages:
+        clipped = remove_overlap(passage, spans)
+        if clipped is None or len(clipped[1]) < MIN_PASSAGE_CHARS and clipped[1] != passage['text']:
+            dropped += 1
+            continue
+        start, text = clipped
+        # Text clipped to follow an accepted passage already starts on its sentence boundary
+        skipped, text = tidy_edges(text, bool(start) and start == passage.get('start'))
+        if start is not None:
+            start += skipped
+
+        header_tokens = estimate_tokens(format_passage(passage.get('title', ''), ''))
+        remaining = budget - tokens - header_tokens
+        if remaining <= 0:
+            dropped += 1
+            continue
+        if estimate_tokens(text) > remaining:
+            text = trim_to_sentences(text, remaining * CHARS_PER_TOKEN)
+            if len(text) < MIN_PASSAGE_CHARS:
+                dropped += 1
+                continue
+
+        part = format_passage(passage.get('title', ''), text)
+        parts.append(part)
+        used.append(passage)
+        tokens += estimate_tokens(part)
+        if start is not None:
+            spans.setdefault(passage.get('article_id'), []).append((start, start + len(text)))
+
+    return PackedContext(''.join(parts), used, tokens, dropped)
+
+
+def context_budget(*prompt_parts):
+    """Tokens left for knowledge base context once the rest of the prompt is counted"""
+    fixed = sum(estimate_tokens(part) for part in prompt_parts if part)
+    return max(0, min(settings.PROMPT_CONTEXT_TOKENS, settings.PROMPT_TOKEN_BUDGET - fixed))
+
+
+def fit_history(messages, budget):
+    """
+    "Role: text" lines for the newest messages (given newest first) that fit
+    in budget tokens, in chronological order. The oldest message that does
+    not fit whole is cut at a sentence boundary.
+    """
+    lines, used = [], 0
+    for msg in messages:
+        role = "User" if msg.role == "user" else "Assistant"
+        line = f"{role}: {msg.content}"
+        remaining = budget - used
+        if remaining <= 0:
+            break
+        if estimate_tokens(line) > remaining:
+            line = trim_to_sentences(line, remaining * CHARS_PER_TOKEN)
+            if len(line) > len(role) + 2:
+                lines.append(line)
+            break
+        lines.append(line)
+        used += estimate_tokens(line)
+    lines.reverse()
+    return lines
+
+
+def as_passages(context):
+    """Accept either ranked passages or a legacy pre-formatted context string"""
+    if not context:
+        return []
+    if isinstance(context, str):
+        return [{'text': context}]
+    return list(context)
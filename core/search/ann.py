@@ -0,0 +1,178 @@
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from . import vector
+from .chunking import published_passages
+from .vector import VectorIndex
+
+# k-means is trained on up to this many vectors per list
+TRAIN_PER_LIST = 64
+
+
+def kmeans(vectors, n_clusters, iterations=10, seed=0, batch_size=65536):
+    """Spherical k-means over L2-normalised rows; returns normalised centroids"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        sums = np.zeros_like(centroids)
+        counts = np.zeros(n_clusters, dtype=np.int64)
+        for start in range(0, len(vectors), batch_size):
+            batch = vectors[start:start + batch_size]
+            assignment = np.argmax(batch @ centroids.T, axis=1)
+            np.add.at(sums, assignment, batch)
+            counts += np.bincount(assignment, minlength=n_clusters)
+        empty = counts == 0
+        # Re-seed empty clusters from random rows so every list stays in use
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype(np.float32)
+    return centroids
+
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index.
+
+    Vectors are partitioned by their nearest k-means centroid into `nlist`
+    lists, each a packed VectorIndex. A query only scores the vectors in the
+    `nprobe` lists whose centroids are closest to it: raising nprobe trades
+    latency for recall, and nprobe == nlist is an exact search.
+
+    Exposes the same add/remove/remove_group/search_vector interface as
+    VectorIndex so it can replace it in the retrieval layer.
+    """
+
+    def __init__(self, centroids, nprobe=8):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.dim = self.centroids.shape[1]
+        self.nprobe = nprobe
+        self.lists = [VectorIndex(self.dim, capacity=16) for _ in range(len(self.centroids))]
+        self._list_of = {}  # doc_id -> list number
+        self.groups = defaultdict(set)
+        self._doc_group = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def build(cls, doc_ids, vectors, groups=None, nlist=None, nprobe=8, train_size=None, seed=0):
+        """Train centroids on (a sample of) vectors, then insert all of them"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        nlist = min(nlist or default_nlist(len(vectors)), len(vectors))
+        train_size = train_size or min(len(vectors), nlist * TRAIN_PER_LIST)
+        rng = np.random.default_rng(seed)
+        sample = vectors[rng.choice(len(vectors), train_size, replace=False)]
+        index = cls.trained(sample, nlist, nprobe=nprobe, seed=seed)
+        index.add(doc_ids, vectors, groups)
+        return index
+
+    @classmethod
+    def trained(cls, sample, nlist, nprobe=8, seed=0):
+        """An empty index whose nlist centroids are trained on the sample vectors"""
+        return cls(kmeans(sample, min(nlist, len(sample)), seed=seed), nprobe=nprobe)
+
+    def __len__(self):
+        return len(self._list_of)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._list_of
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    def add(self, doc_ids, vectors, groups=None):
+        """Insert or replace a batch of documents"""
+        if len(doc_ids) == 0:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        assignment = np.argmax(vectors @ self.centroids.T, axis=1)
+        with self._lock:
+            for doc_id in doc_ids:
+                self._remove(doc_id)
+            for list_no in np.unique(assignment):
+                rows = np.flatnonzero(assignment == list_no)
+                self.lists[list_no].add([doc_ids[row] for row in rows], vectors[rows])
+            for position, doc_id in enumerate(doc_ids):
+                self._list_of[doc_id] = int(assignment[position])
+                if groups is not None and groups[position] is not None:
+                    self.groups[groups[position]].add(doc_id)
+                    self._doc_group[doc_id] = groups[position]
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def remove_group(self, group):
+        """Remove every document added under group"""
+        with self._lock:
+            for doc_id in list(self.groups.get(group, ())):
+                self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        list_no = self._list_of.pop(doc_id, None)
+        if list_no is None:
+            return
+        self.lists[list_no].remove(doc_id)
+        group = self._doc_group.pop(doc_id, None)
+        if group is not None:
+            self.groups[group].discard(doc_id)
+            if not self.groups[group]:
+                del self.groups[group]
+
+    def search_vector(self, vector, k=10, nprobe=None):
+        """Return up to k (doc_id, similarity) pairs from the nprobe closest lists"""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        with self._lock:
+            centroid_scores = self.centroids @ vector
+            probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+            lists = [self.lists[list_no] for list_no in probes if self.lists[list_no].size]
+            if not lists:
+                return []
+            ids = np.concatenate([lst.ids[:lst.size] for lst in lists])
+            scores = np.concatenate([lst.matrix[:lst.size] @ vector for lst in lists])
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+def default_nlist(count):
+    return max(1, int(np.sqrt(count)))
+
+
+def build_passage_ivf(count, nlist=None, nprobe=8, batch_size=1000, seed=0):
+    """
+    Build an IVFIndex over the published passages (about `count` of them)
+    without holding all their vectors at once: one pass embeds a random sample
+    to train the centroids, a second embeds and inserts every passage batch by
+    batch.
+    """
+    nlist = min(nlist or default_nlist(count), count)
+    rng = np.random.default_rng(seed)
+    chosen = np.zeros(count, dtype=bool)
+    chosen[rng.choice(count, min(count, nlist * TRAIN_PER_LIST), replace=False)] = True
+
+    sample, texts = [], []
+    for position, (_, _, text) in enumerate(published_passages(batch_size)):
+        if position < count and chosen[position]:
+            texts.append(text)
+            if len(texts) == batch_size:
+                sample.append(vector.embedder().embed(texts))
+                texts = []
+    if texts:
+        sample.append(vector.embedder().embed(texts))
+    if not sample:
+        return vector.build_passage_vectors(batch_size)
+
+    index = IVFIndex.trained(np.concatenate(sample), nlist, nprobe=nprobe, seed=seed)
+    del sample
+    return vector.build_passage_vectors(batch_size, index=index)
+
+
+def from_exact(index, nlist=None, nprobe=8, seed=0):
+    """Build an IVFIndex holding the same documents and groups as a VectorIndex"""
+    doc_ids = [int(doc_id) for doc_id in index.ids[:index.size]]
+    groups = [index.group_of(doc_id) for doc_id in doc_ids]
+    return IVFIndex.build(doc_ids, index.matrix[:index.size], groups, nlist=nlist, nprobe=nprobe, seed=seed)
@@ -0,0 +1,195 @@
+"""
+Semantic cache of chat answers.
+
+Answers are stored per process, keyed by the embedded, normalized question
+and a fingerprint of the passages retrieved for it. A new question reuses an
+answer when it retrieved the same passages, has the same negations, wh-words
+and modals (which the embedding cannot see, as tokenize() drops them) and its
+embedding is at least ANSWER_CACHE['threshold'] cosine-similar to the cached
+question. Entries expire after 'ttl' seconds, the least recently used are
+evicted beyond 'max_entries', and entries citing an article are dropped when
+it changes.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from . import vector
+from .result_cache import _count, normalize_query
+from .text import question_terms
+
+HITS_KEY = 'answers:cache_hits'
+MISSES_KEY = 'answers:cache_misses'
+SAVED_MS_KEY = 'answers:saved_ms'
+
+
+class CachedAnswer:
+    __slots__ = ('vector', 'bucket', 'answer', 'article_ids', 'expires', 'generation_ms')
+
+    def __init__(self, vector, bucket, answer, article_ids, expires, generation_ms):
+        self.vector = vector
+        self.bucket = bucket
+        self.answer = answer
+        self.article_ids = article_ids
+        self.expires = expires
+        self.generation_ms = generation_ms
+
+
+class SemanticAnswerCache:
+    """LRU/TTL store of answers, searched by question similarity within a bucket"""
+
+    def __init__(self, threshold=0.9, ttl=3600, max_entries=5000):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # entry id -> CachedAnswer, least recently used first
+        self.buckets = defaultdict(set)  # (fingerprint, question terms) -> entry ids
+        self.by_article = defaultdict(set)  # article id -> entry ids
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, question_vector, bucket):
+        """Return the most similar live entry above the threshold, or None"""
+        now = time.monotonic()
+        with self.lock:
+            best_id, best_score = None, self.threshold
+            for entry_id in list(self.buckets.get(bucket, ())):
+                entry = self.entries[entry_id]
+                if entry.expires <= now:
+                    self._drop(entry_id)
+                    continue
+                score = float(np.dot(entry.vector, question_vector))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+            if best_id is None:
+                return None
+            self.entries.move_to_end(best_id)
+            return self.entries[best_id]
+
+    def store(self, question_vector, bucket, answer, article_ids, generation_ms):
+        with self.lock:
+            while len(self.entries) >= self.max_entries:
+                self._drop(next(iter(self.entries)))
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = CachedAnswer(
+                question_vector, bucket, answer, frozenset(article_ids),
+                time.monotonic() + self.ttl, generation_ms,
+            )
+            self.buckets[bucket].add(entry_id)
+            for article_id in article_ids:
+                self.by_article[article_id].add(entry_id)
+
+    def invalidate_articles(self, article_ids):
+        """Drop every answer whose context came from one of these articles"""
+        with self.lock:
+            for article_id in article_ids:
+                for entry_id in list(self.by_article.get(article_id, ())):
+                    self._drop(entry_id)
+
+    def _drop(self, entry_id):
+        entry = self.entries.pop(entry_id)
+        entries = self.buckets[entry.bucket]
+        entries.discard(entry_id)
+        if not entries:
+            del self.buckets[entry.bucket]
+        for article_id in entry.article_ids:
+            ids = self.by_article[article_id]
+            ids.discard(entry_id)
+            if not ids:
+                del self.by_article[article_id]
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def current_answer_cache():
+    """Return the process-wide answer cache if it exists, else None"""
+    return _cache
+
+
+def get_answer_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = settings.ANSWER_CACHE
+                _cache = SemanticAnswerCache(config['threshold'], config['ttl'], config['max_entries'])
+    return _cache
+
+
+def reset_answer_cache():
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+def fingerprint(context):
+    """Stable digest of the retrieved passages (or context string) an answer was based on"""
+    if isinstance(context, str):
+        key = context
+    else:
+        key = '|'.join(f"{p['article_id']}:{p.get('start', 0)}" for p in context or ())
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def article_ids_of(context):
+    if isinstance(context, str):
+        return ()
+    return {passage['article_id'] for passage in context or ()}
+
+
+def bucket(question, context):
+    """Only questions with the same passages and question terms are compared"""
+    return fingerprint(context), question_terms(question)
+
+
+def embed_question(question):
+    return vector.embedder().embed([normalize_query(question)])[0]
+
+
+def lookup(question, context):
+    """Return a cached answer for this question and context, counting the hit or miss"""
+    from .indexing import ensure_current
+
+    ensure_current()
+    entry = get_answer_cache().lookup(embed_question(question), bucket(question, context))
+    if entry is None:
+        _count(MISSES_KEY)
+        return None
+    _count(HITS_KEY)
+    cache.add(SAVED_MS_KEY, 0, timeout=None)
+    try:
+        cache.incr(SAVED_MS_KEY, int(entry.generation_ms))
+    except ValueError:
+        pass
+    return entry.answer
+
+
+def store(question, context, answer, generation_ms):
+    get_answer_cache().store(
+        embed_question(question), bucket(question, context), answer, article_ids_of(context), generation_ms
+    )
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    answers = current_answer_cache()
+    return {
+        'entries': len(answers) if answers is not None else 0,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0.0,
+        'latency_saved_ms': cache.get(SAVED_MS_KEY, 0),
+    }
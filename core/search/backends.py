@@ -0,0 +1,30 @@
+from django.conf import settings
+
+from . import bm25, fts, vector
+
+
+def _bm25(query, k):
+    return bm25.get_passage_index().search(query, k=k)
+
+
+def _fts(query, k):
+    return fts.search_passages(query, limit=k)
+
+
+def _vector(query, k):
+    return vector.search(query, k=k)
+
+
+BACKENDS = {
+    'bm25': _bm25,
+    'fts': _fts,
+    'vector': _vector,
+}
+
+
+def search_passages(query, k=3, backend=None):
+    """Return up to k (chunk_id, score) pairs from the configured backend"""
+    name = backend or settings.SEARCH_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SEARCH_BACKEND '{name}'. Choose from: {', '.join(BACKENDS)}")
+    return BACKENDS[name](query, k)
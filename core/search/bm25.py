@@ -0,0 +1,129 @@
+import heapq
+import math
+import threading
+from collections import Counter, defaultdict
+
+from .chunking import published_passages
+from .text import tokenize
+
+
+class BM25Index:
+    """In-memory inverted index scored with Okapi BM25"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self.doc_lengths = {}
+        self.total_length = 0
+        self._doc_terms = {}  # doc_id -> terms, so a document can be removed
+        self.groups = defaultdict(set)  # group (e.g. article id) -> doc_ids
+        self._doc_group = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id, text, group=None):
+        """Index a document, replacing any previous version of it"""
+        counts = Counter(tokenize(text))
+        with self._lock:
+            self._remove(doc_id)
+            if group is not None:
+                self.groups[group].add(doc_id)
+                self._doc_group[doc_id] = group
+            for term, tf in counts.items():
+                self.postings[term][doc_id] = tf
+            length = sum(counts.values())
+            self.doc_lengths[doc_id] = length
+            self.total_length += length
+            self._doc_terms[doc_id] = tuple(counts)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def remove_group(self, group):
+        """Remove every document added under group"""
+        with self._lock:
+            for doc_id in list(self.groups.get(group, ())):
+                self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        group = self._doc_group.pop(doc_id, None)
+        if group is not None:
+            self.groups[group].discard(doc_id)
+            if not self.groups[group]:
+                del self.groups[group]
+        for term in terms:
+            docs = self.postings[term]
+            docs.pop(doc_id, None)
+            if not docs:
+                del self.postings[term]
+        self.total_length -= self.doc_lengths.pop(doc_id)
+
+    def idf(self, term):
+        n = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.doc_lengths) - n + 0.5) / (n + 0.5))
+
+    def search(self, query, k=10):
+        """Return up to k (doc_id, score) pairs, best match first"""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+
+        with self._lock:
+            if not self.doc_lengths:
+                return []
+            avg_length = self.total_length / len(self.doc_lengths)
+            scores = defaultdict(float)
+            for term in terms:
+                docs = self.postings.get(term)
+                if not docs:
+                    continue
+                idf = self.idf(term)
+                for doc_id, tf in docs.items():
+                    norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_passage_index():
+    """Build a BM25 index over the passages of all published articles"""
+    index = BM25Index()
+    for chunk_id, article_id, text in published_passages():
+        index.add(chunk_id, text, group=article_id)
+    return index
+
+
+def current_passage_index():
+    """Return the process-wide index if it has been built, else None"""
+    return _index
+
+
+def get_passage_index():
+    """Return the process-wide passage index, building it on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_passage_index()
+    return _index
+
+
+def reset_passage_index():
+    """Drop the process-wide index so the next search rebuilds it"""
+    global _index
+    with _index_lock:
+        _index = None
@@ -0,0 +1,81 @@
+import re
+
+from django.conf import settings
+
+from .text import passage_text
+
+WORD_RE = re.compile(r'\S+')
+
+
+def chunk_text(text, size=None, overlap=None):
+    """
+    Split text into overlapping windows of `size` words.
+
+    Consecutive windows share `overlap` words so an answer that straddles a
+    boundary is still found whole in one passage. Returns (start, passage)
+    pairs where start is the character offset of the passage in text.
+    """
+    size = size or settings.SEARCH_CHUNK_WORDS
+    overlap = settings.SEARCH_CHUNK_OVERLAP if overlap is None else overlap
+    if overlap >= size:
+        raise ValueError("Chunk overlap must be smaller than the chunk size")
+
+    words = [match.span() for match in WORD_RE.finditer(text or '')]
+    if not words:
+        return []
+
+    chunks = []
+    step = size - overlap
+    for first in range(0, len(words), step):
+        last = min(first + size, len(words)) - 1
+        start, end = words[first][0], words[last][1]
+        chunks.append((start, text[start:end]))
+        if last == len(words) - 1:
+            break
+    return chunks
+
+
+def chunk_article(article):
+    """Replace an article's chunks if its title or content changed; returns True if rewritten"""
+    from core.models import ArticleChunk
+
+    new_chunks = chunk_text(article.content)
+    existing = list(article.chunks.values_list('title', 'start', 'text'))
+    if existing == [(article.title, start, text) for start, text in new_chunks]:
+        return False
+
+    article.chunks.all().delete()
+    ArticleChunk.objects.bulk_create(build_chunks(article, new_chunks))
+    return True
+
+
+def build_chunks(article, chunks=None):
+    """Unsaved ArticleChunk objects for an article, for bulk_create"""
+    from core.models import ArticleChunk
+
+    if chunks is None:
+        chunks = chunk_text(article.content)
+    return [
+        ArticleChunk(article=article, position=position, title=article.title, text=text, start=start)
+        for position, (start, text) in enumerate(chunks)
+    ]
+
+
+def count_published_passages():
+    from core.models import ArticleChunk
+
+    return ArticleChunk.objects.filter(article__is_published=True).count()
+
+
+def published_passages(batch_size=1000, article_ids=None):
+    """Stream (chunk_id, article_id, indexed text) for every chunk of a published article"""
+    from core.models import ArticleChunk
+
+    chunks = ArticleChunk.objects.filter(article__is_published=True)
+    if article_ids is not None:
+        chunks = chunks.filter(article_id__in=article_ids)
+    rows = chunks.values_list(
+        'id', 'article_id', 'title', 'text', 'article__category__name'
+    ).iterator(chunk_size=batch_size)
+    for chunk_id, article_id, title, text, category in rows:
+        yield chunk_id, article_id, passage_text(title, text, category)
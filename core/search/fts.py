@@ -0,0 +1,137 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from .text import STOPWORDS
+
+FTS_TABLE = 'core_article_fts'
+CHUNK_FTS_TABLE = 'core_articlechunk_fts'
+
+# Column weights for bm25(): title, description, content
+COLUMN_WEIGHTS = (10.0, 4.0, 1.0)
+
+# Column weights for bm25() over passages: title, text
+CHUNK_COLUMN_WEIGHTS = (4.0, 1.0)
+
+QUERY_PART_RE = re.compile(r'"([^"]*)"|(\w+\*?)')
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def build_match_query(query, operator='AND'):
+    """
+    Turn user input into a safe FTS5 MATCH expression.
+
+    "quoted text" becomes a phrase query and a trailing * a prefix query.
+    Every term is quoted so FTS5 operators typed by users are never parsed.
+    With operator='OR' stopwords are dropped, which suits natural-language
+    chat questions where rank ordering does the work.
+    """
+    parts = []
+    for phrase, word in QUERY_PART_RE.findall(query or ''):
+        if phrase:
+            words = re.findall(r'\w+', phrase)
+            if words:
+                parts.append('"%s"' % ' '.join(words))
+            continue
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if operator == 'OR' and word.lower() in STOPWORDS:
+            continue
+        parts.append('"%s"%s' % (word, '*' if prefix else ''))
+    return f' {operator} '.join(parts)
+
+
+def search(query, limit=10, operator='AND', category=None):
+    """Return up to limit (article_id, score) pairs for published articles, best first, optionally in one category slug"""
+    match = build_match_query(query, operator)
+    if not match:
+        return []
+
+    if not is_available():
+        return _search_fallback(query, limit, category)
+
+    # The category is filtered before LIMIT, so the top matches of other categories do not crowd it out
+    category_join = category_filter = ''
+    params = [*COLUMN_WEIGHTS, match]
+    if category:
+        category_join = 'JOIN core_category ON core_category.id = core_article.category_id'
+        category_filter = 'AND core_category.slug = %s'
+        params.append(category)
+    sql = f"""
+        SELECT {FTS_TABLE}.rowid, -bm25({FTS_TABLE}, %s, %s, %s) AS score
+        FROM {FTS_TABLE}
+        JOIN core_article ON core_article.id = {FTS_TABLE}.rowid
+        {category_join}
+        WHERE {FTS_TABLE} MATCH %s AND core_article.is_published = 1 {category_filter}
+        ORDER BY score DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, limit])
+        return cursor.fetchall()
+
+
+def search_passages(query, limit=10, operator='OR'):
+    """Return up to limit (chunk_id, score) pairs from published articles, best first"""
+    match = build_match_query(query, operator)
+    if not match:
+        return []
+
+    if not is_available():
+        return _search_passages_fallback(query, limit)
+
+    sql = f"""
+        SELECT {CHUNK_FTS_TABLE}.rowid, -bm25({CHUNK_FTS_TABLE}, %s, %s) AS score
+        FROM {CHUNK_FTS_TABLE}
+        JOIN core_articlechunk ON core_articlechunk.id = {CHUNK_FTS_TABLE}.rowid
+        JOIN core_article ON core_article.id = core_articlechunk.article_id
+        WHERE {CHUNK_FTS_TABLE} MATCH %s AND core_article.is_published = 1
+        ORDER BY score DESC
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*CHUNK_COLUMN_WEIGHTS, match, limit])
+        return cursor.fetchall()
+
+
+def _search_passages_fallback(query, limit):
+    from core.models import ArticleChunk
+
+    ids = ArticleChunk.objects.filter(
+        Q(title__icontains=query) | Q(text__icontains=query),
+        article__is_published=True
+    ).values_list('id', flat=True)[:limit]
+    return [(chunk_id, 0.0) for chunk_id in ids]
+
+
+def _search_fallback(query, limit, category=None):
+    from core.models import Article
+
+    articles = Article.objects.filter(
+        Q(title__icontains=query) |
+        Q(description__icontains=query) |
+        Q(content__icontains=query),
+        is_published=True
+    )
+    if category:
+        articles = articles.filter(category__slug=category)
+    ids = articles.values_list('id', flat=True)[:limit]
+    return [(article_id, 0.0) for article_id in ids]
+
+
+def filter_articles(queryset, query, limit=None, category=None):
+    """Restrict an Article queryset to full-text matches, ordered by rank; pass its category slug filter as category"""
+    limit = limit or settings.SEARCH_MAX_RESULTS
+    ids = [article_id for article_id, _ in search(query, limit, category=category)]
+    if not ids:
+        return queryset.none()
+    rank = Case(
+        *[When(pk=article_id, then=Value(position)) for position, article_id in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(pk__in=ids).order_by(rank)
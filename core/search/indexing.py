@@ -0,0 +1,141 @@
+from . import answer_cache, bm25, related, result_cache, suggest, vector
+from .chunking import published_passages
+
+# Article fields that change what the search indexes hold
+INDEXED_FIELDS = frozenset({'title', 'content', 'is_published', 'category'})
+
+BATCH_SIZE = 500
+
+# Corpus version the in-memory indexes of this process reflect
+_applied_version = None
+
+
+def batched(items, size=BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def reindex_articles(article_ids, update_related=True):
+    """
+    Refresh the in-memory passage and typeahead indexes for these articles only,
+    and recompute the related-article rows they affect in the background
+    (bulk loaders pass update_related=False and rebuild the table once at the end).
+
+    Their old passages are dropped and the current passages of the ones that
+    are still published are added back; vectors are embedded once per batch.
+    Indexes that have not been built in this process are left alone, they will
+    read the current state when first used.
+
+    The corpus version is bumped only once the indexes are updated, so a search
+    in this process never caches results of the old index under the new version.
+    """
+    try:
+        refresh_suggestions(article_ids)
+        lexical = bm25.current_passage_index()
+        dense = vector.current_passage_vectors()
+        if lexical is not None or dense is not None:
+            update_passages(article_ids, lexical, dense)
+    finally:
+        invalidate_answers(article_ids)
+        mark_corpus_changed()
+    if update_related:
+        related.update_in_background(article_ids)
+
+
+def update_passages(article_ids, lexical, dense):
+    for batch in batched(article_ids):
+        rows = list(published_passages(article_ids=batch))
+        for index in (lexical, dense):
+            if index is not None:
+                for article_id in batch:
+                    index.remove_group(article_id)
+        if lexical is not None:
+            for chunk_id, article_id, text in rows:
+                lexical.add(chunk_id, text, group=article_id)
+        if dense is not None:
+            vector.add_passages(dense, rows)
+
+
+def remove_articles(article_ids):
+    """Drop every passage of these articles from the in-memory indexes, then bump the corpus version"""
+    try:
+        for index in (bm25.current_passage_index(), vector.current_passage_vectors()):
+            if index is not None:
+                for article_id in article_ids:
+                    index.remove_group(article_id)
+        typeahead = suggest.current_suggest_index()
+        if typeahead is not None:
+            for article_id in article_ids:
+                typeahead.remove_article(article_id)
+    finally:
+        invalidate_answers(article_ids)
+        mark_corpus_changed()
+    related.update_in_background((), article_ids)
+
+
+def invalidate_answers(article_ids):
+    answers = answer_cache.current_answer_cache()
+    if answers is not None:
+        answers.invalidate_articles(article_ids)
+
+
+def refresh_suggestions(article_ids):
+    """Re-add published articles to the typeahead index and drop the rest"""
+    from core.models import Article
+
+    typeahead = suggest.current_suggest_index()
+    if typeahead is None:
+        return
+    for batch in batched(article_ids):
+        rows = Article.objects.filter(id__in=batch).values_list(
+            'id', 'title', 'slug', 'description', 'views', 'is_published'
+        )
+        found = set()
+        for article_id, title, slug, description, views, is_published in rows:
+            found.add(article_id)
+            if is_published:
+                typeahead.add_article(article_id, title, slug, description, views)
+            else:
+                typeahead.remove_article(article_id)
+        for article_id in set(batch) - found:
+            typeahead.remove_article(article_id)
+
+
+def mark_corpus_changed():
+    """Bump the shared corpus version, invalidating cached search results"""
+    global _applied_version
+    version = result_cache.bump_corpus_version()
+    if _applied_version == version - 1:
+        _applied_version = version
+
+
+def ensure_current():
+    """
+    Drop this process's in-memory indexes if another worker changed the corpus.
+
+    Changes made in this process are applied incrementally and advance
+    _applied_version with the shared version; any other bump means an update
+    this process has not seen, so its indexes are rebuilt on next use.
+    """
+    global _applied_version
+    version = result_cache.corpus_version()
+    if _applied_version is not None and version != _applied_version:
+        bm25.reset_passage_index()
+        vector.reset_passage_vectors()
+        related.reset_article_vectors()
+        answer_cache.reset_answer_cache()
+        suggest.reset_suggest_index()
+    _applied_version = version
+
+
+def reindex_category(category_id, name, slug):
+    typeahead = suggest.current_suggest_index()
+    if typeahead is not None:
+        typeahead.add_category(category_id, name, slug)
+
+
+def remove_category(category_id):
+    typeahead = suggest.current_suggest_index()
+    if typeahead is not None:
+        typeahead.remove_category(category_id)
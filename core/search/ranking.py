@@ -0,0 +1,122 @@
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from .backends import BACKENDS, search_passages
+
+logger = logging.getLogger(__name__)
+
+
+class Ranking:
+    """Ranked (chunk_id, score) hits plus how long each stage took, in milliseconds"""
+
+    def __init__(self, hits, timings):
+        self.hits = hits
+        self.timings = timings
+
+    def __iter__(self):
+        return iter(self.hits)
+
+    def __repr__(self):
+        return f"<Ranking {len(self.hits)} hits {self.timings}>"
+
+
+class Timer:
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.timings[self.stage] = round((time.perf_counter() - self.start) * 1000, 3)
+
+
+def reciprocal_rank_fusion(ranked_lists, weights, rrf_k=60):
+    """Fuse {name: [(doc_id, score), ...]} by weighted reciprocal rank"""
+    fused = {}
+    for name, hits in ranked_lists.items():
+        weight = weights.get(name, 1.0)
+        for rank, (doc_id, _) in enumerate(hits, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (rrf_k + rank)
+    return fused
+
+
+def document_signals(chunk_ids):
+    """Return {chunk_id: (article views, article updated_at)}"""
+    from core.models import ArticleChunk
+
+    rows = ArticleChunk.objects.filter(id__in=chunk_ids).values_list(
+        'id', 'article__views', 'article__updated_at'
+    )
+    return {chunk_id: (views, updated_at) for chunk_id, views, updated_at in rows}
+
+
+def hybrid_search(query, k=3):
+    """
+    Rank passages in three stages, each with its own cutoff:
+
+    1. every retriever in SEARCH_RANKING['retrievers'] returns its top
+       'candidates' passages;
+    2. the lists are fused with weighted reciprocal rank fusion and cut to
+       the top 'rerank';
+    3. only those are re-scored with article popularity (views) and recency
+       (updated_at, exponential decay) before the final top k is returned.
+    """
+    config = settings.SEARCH_RANKING
+    timings = {}
+
+    ranked_lists = {}
+    for name in config['retrievers']:
+        with Timer(timings, name):
+            ranked_lists[name] = BACKENDS[name](query, config['candidates'])
+
+    with Timer(timings, 'fusion'):
+        fused = reciprocal_rank_fusion(ranked_lists, config['retrievers'], config['rrf_k'])
+        candidates = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:config['rerank']]
+
+    with Timer(timings, 'rerank'):
+        hits = []
+        if candidates:
+            signals = document_signals([chunk_id for chunk_id, _ in candidates])
+            best = candidates[0][1]
+            max_views = max((views for views, _ in signals.values()), default=0)
+            now = timezone.now()
+            half_life = config['recency_half_life_days']
+            for chunk_id, score in candidates:
+                if chunk_id not in signals:
+                    continue
+                views, updated_at = signals[chunk_id]
+                popularity = math.log1p(views) / math.log1p(max_views) if max_views else 0.0
+                age_days = max((now - updated_at).total_seconds() / 86400, 0.0)
+                recency = 0.5 ** (age_days / half_life)
+                score = (
+                    score / best
+                    + config['popularity_weight'] * popularity
+                    + config['recency_weight'] * recency
+                )
+                hits.append((chunk_id, score))
+            hits.sort(key=lambda item: item[1], reverse=True)
+            hits = hits[:k]
+
+    return Ranking(hits, timings)
+
+
+def rank_passages(query, k=3):
+    """Rank passages with SEARCH_BACKEND ("hybrid" or a single retriever)"""
+    start = time.perf_counter()
+    if settings.SEARCH_BACKEND == 'hybrid':
+        ranking = hybrid_search(query, k)
+    else:
+        timings = {}
+        with Timer(timings, settings.SEARCH_BACKEND):
+            hits = search_passages(query, k)
+        ranking = Ranking(hits, timings)
+    ranking.timings['total'] = round((time.perf_counter() - start) * 1000, 3)
+    logger.debug("Search timings: %s", ranking.timings)
+    return ranking
@@ -0,0 +1,213 @@
+import logging
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from .text import article_text
+from .vector import VectorIndex, embedder
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Columns of the similarity matrix scored at a time, so a batch never holds BATCH_SIZE x N scores
+COLUMN_CHUNK = 4096
+
+_vectors = None
+_vectors_lock = threading.Lock()
+_update_lock = threading.Lock()
+
+# Article ids waiting for the background worker; updates queued while it is busy are merged
+_pending_changed = set()
+_pending_removed = set()
+_pending_ready = threading.Condition()
+_worker = None
+
+
+def embed_articles(index, article_ids=None, batch_size=BATCH_SIZE):
+    """(Re-)embed published articles into index, all of them or only article_ids"""
+    from core.models import Article
+
+    articles = Article.objects.filter(is_published=True)
+    if article_ids is not None:
+        articles = articles.filter(id__in=article_ids)
+    rows = articles.values_list('id', 'title', 'description', 'content').iterator(chunk_size=batch_size)
+    batch_ids, batch_texts = [], []
+    for article_id, title, description, content in rows:
+        batch_ids.append(article_id)
+        batch_texts.append(article_text(title, description, content))
+        if len(batch_ids) == batch_size:
+            index.add(batch_ids, embedder().embed(batch_texts))
+            batch_ids, batch_texts = [], []
+    if batch_ids:
+        index.add(batch_ids, embedder().embed(batch_texts))
+
+
+def get_article_vectors():
+    """Process-wide article embeddings, built on first use"""
+    global _vectors
+    if _vectors is None:
+        with _vectors_lock:
+            if _vectors is None:
+                index = VectorIndex(embedder().dim)
+                embed_articles(index)
+                _vectors = index
+    return _vectors
+
+
+def reset_article_vectors():
+    global _vectors
+    with _vectors_lock:
+        _vectors = None
+
+
+def nearest(index, rows, top_n):
+    """For each row of index, the top_n most similar other articles as (id, score) lists"""
+    matrix = index.matrix[:index.size]
+    ids = index.ids[:index.size]
+    top_n = min(top_n, index.size - 1)
+    if top_n <= 0:
+        return [[] for _ in rows]
+    queries = matrix[rows]
+    # Running top_n per row, merged with each chunk of columns in turn
+    best_scores = np.full((len(rows), top_n), -np.inf, dtype=matrix.dtype)
+    best_cols = np.zeros((len(rows), top_n), dtype=np.int64)
+    for start in range(0, len(matrix), COLUMN_CHUNK):
+        chunk = matrix[start:start + COLUMN_CHUNK]
+        scores = queries @ chunk.T
+        own = np.flatnonzero((rows >= start) & (rows < start + len(chunk)))
+        scores[own, rows[own] - start] = -np.inf  # an article is not related to itself
+        scores = np.concatenate([best_scores, scores], axis=1)
+        cols = np.concatenate([best_cols, np.broadcast_to(np.arange(start, start + len(chunk)), (len(rows), len(chunk)))], axis=1)
+        top = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_cols = np.take_along_axis(cols, top, axis=1)
+    results = []
+    for row_scores, row_cols in zip(best_scores, best_cols):
+        order = np.argsort(-row_scores)
+        results.append([(int(ids[row_cols[i]]), float(row_scores[i])) for i in order if row_scores[i] > 0])
+    return results
+
+
+def store(index, article_ids, top_n):
+    """Recompute and replace the RelatedArticle rows of article_ids, in batches"""
+    from core.models import RelatedArticle
+
+    rows_of = {int(doc_id): row for row, doc_id in enumerate(index.ids[:index.size])}
+    article_ids = list(article_ids)
+    for start in range(0, len(article_ids), BATCH_SIZE):
+        batch = article_ids[start:start + BATCH_SIZE]
+        present = [article_id for article_id in batch if article_id in rows_of]
+        neighbours = nearest(index, np.array([rows_of[a] for a in present], dtype=np.int64), top_n)
+        with transaction.atomic():
+            RelatedArticle.objects.filter(article_id__in=batch).delete()
+            RelatedArticle.objects.bulk_create([
+                RelatedArticle(article_id=article_id, related_id=related_id, score=score, rank=rank)
+                for article_id, hits in zip(present, neighbours)
+                for rank, (related_id, score) in enumerate(hits)
+            ])
+
+
+def compute_all(top_n=None):
+    """Rebuild the whole RelatedArticle table; returns the number of articles"""
+    global _vectors
+    top_n = top_n or settings.RELATED_ARTICLES_COUNT
+    index = VectorIndex(embedder().dim)
+    embed_articles(index)
+    with _update_lock:
+        from core.models import RelatedArticle
+
+        live = [int(doc_id) for doc_id in index.ids[:index.size]]
+        RelatedArticle.objects.exclude(article_id__in=live).delete()
+        store(index, live, top_n)
+        _vectors = index
+    return len(live)
+
+
+def affected_articles(index, changed_ids, removed_ids):
+    """
+    Articles whose related list may change: the changed ones, every article
+    that currently lists a changed or removed one, and among each changed
+    article's nearest candidates those it would now beat the weakest entry of.
+    """
+    from django.db.models import Count, Min
+    from core.models import RelatedArticle
+
+    top_n = settings.RELATED_ARTICLES_COUNT
+    affected = {article_id for article_id in changed_ids if article_id in index}
+    affected.update(
+        RelatedArticle.objects.filter(related_id__in=list(changed_ids) + list(removed_ids))
+        .values_list('article_id', flat=True)
+    )
+
+    rows_of = {int(doc_id): row for row, doc_id in enumerate(index.ids[:index.size])}
+    present = [article_id for article_id in changed_ids if article_id in rows_of]
+    if present:
+        candidates = nearest(
+            index, np.array([rows_of[a] for a in present], dtype=np.int64),
+            settings.RELATED_ARTICLES_CANDIDATES,
+        )
+        best = {}
+        for hits in candidates:
+            for related_id, score in hits:
+                best[related_id] = max(score, best.get(related_id, 0.0))
+        weakest = dict(
+            (article_id, (count, lowest)) for article_id, count, lowest in
+            RelatedArticle.objects.filter(article_id__in=list(best))
+            .values('article_id').annotate(count=Count('id'), lowest=Min('score'))
+            .values_list('article_id', 'count', 'lowest')
+        )
+        for article_id, score in best.items():
+            count, lowest = weakest.get(article_id, (0, 0.0))
+            if count < top_n or score > lowest:
+                affected.add(article_id)
+    return affected
+
+
+def update_articles(changed_ids, removed_ids=()):
+    """Re-embed changed articles and recompute only the rows they can affect"""
+    from core.models import RelatedArticle
+
+    with _update_lock:
+        index = get_article_vectors()
+        for article_id in list(changed_ids) + list(removed_ids):
+            index.remove(article_id)
+        embed_articles(index, changed_ids)
+        RelatedArticle.objects.filter(article_id__in=removed_ids).delete()
+        affected = affected_articles(index, changed_ids, removed_ids)
+        # Changed articles that are no longer published lose their own rows
+        RelatedArticle.objects.filter(article_id__in=[a for a in changed_ids if a not in index]).delete()
+        store(index, sorted(affected), settings.RELATED_ARTICLES_COUNT)
+
+
+def update_in_background(changed_ids, removed_ids=()):
+    """Queue an update_articles run for the background worker so saves do not wait for it"""
+    global _worker
+    with _pending_ready:
+        # The latest change to an article wins
+        _pending_changed.difference_update(removed_ids)
+        _pending_removed.difference_update(changed_ids)
+        _pending_changed.update(changed_ids)
+        _pending_removed.update(removed_ids)
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='related-articles', daemon=True)
+            _worker.start()
+        _pending_ready.notify()
+
+
+def _work():
+    """Background worker: one update_articles run at a time, over everything queued since the last"""
+    while True:
+        with _pending_ready:
+            while not _pending_changed and not _pending_removed:
+                _pending_ready.wait()
+            changed_ids, removed_ids = list(_pending_changed), list(_pending_removed)
+            _pending_changed.clear()
+            _pending_removed.clear()
+        try:
+            update_articles(changed_ids, removed_ids)
+        except Exception:
+            logger.exception("Failed to update related articles")
+        finally:
+            connection.close()
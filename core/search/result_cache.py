@@ -0,0 +1,76 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'search:corpus_version'
+HITS_KEY = 'search:cache_hits'
+MISSES_KEY = 'search:cache_misses'
+
+
+def corpus_version():
+    """Current corpus version; every cached result is keyed on it"""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a version lost to eviction never reuses old keys
+        cache.add(VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_corpus_version():
+    """Invalidate every cached search result at once; returns the new version"""
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        corpus_version()
+        return cache.incr(VERSION_KEY)
+
+
+def normalize_query(query):
+    return ' '.join((query or '').lower().split())
+
+
+def make_key(query, k, version):
+    digest = hashlib.sha1(normalize_query(query).encode('utf-8')).hexdigest()
+    return f"search:v{version}:{settings.SEARCH_BACKEND}:{k}:{digest}"
+
+
+def _count(key):
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def get_or_compute(query, k, compute):
+    """
+    Return the cached result for (query, k) or compute and cache it.
+
+    The corpus version is read before compute() runs, so a result computed from
+    data that changes meanwhile is stored under the old version and never served.
+    """
+    key = make_key(query, k, corpus_version())
+    result = cache.get(key)
+    if result is not None:
+        _count(HITS_KEY)
+        return result
+
+    _count(MISSES_KEY)
+    result = compute()
+    cache.set(key, result, timeout=settings.SEARCH_CACHE_TIMEOUT)
+    return result
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        'corpus_version': corpus_version(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0.0,
+    }
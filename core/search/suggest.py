@@ -0,0 +1,235 @@
+import heapq
+import logging
+import math
+import threading
+from collections import Counter
+
+from django.db import connection
+from django.urls import reverse
+
+from .text import tokenize
+
+logger = logging.getLogger(__name__)
+
+
+class TrieNode:
+    __slots__ = ('children', 'entries', 'top')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = None  # entry_id -> weight, for keys ending here
+        self.top = []  # best (weight, entry_id) pairs in this subtree, highest first
+
+
+class PrefixTrie:
+    """
+    Prefix trie that keeps the top_k heaviest entries of every subtree on its
+    root node, so a completion is one walk down the prefix and a list copy.
+
+    Keys are truncated to max_depth characters to bound memory; longer
+    prefixes are resolved by the caller filtering the depth-limited results.
+    """
+
+    def __init__(self, top_k=10, max_depth=24):
+        self.root = TrieNode()
+        self.top_k = top_k
+        self.max_depth = max_depth
+
+    def _path(self, key, create=False):
+        nodes = [self.root]
+        for char in key[:self.max_depth]:
+            child = nodes[-1].children.get(char)
+            if child is None:
+                if not create:
+                    return None
+                child = nodes[-1].children[char] = TrieNode()
+            nodes.append(child)
+        return nodes
+
+    def insert(self, key, entry_id, weight):
+        nodes = self._path(key, create=True)
+        leaf = nodes[-1]
+        if leaf.entries is None:
+            leaf.entries = {}
+        leaf.entries[entry_id] = weight
+        for node in nodes:
+            top = [item for item in node.top if item[1] != entry_id]
+            top.append((weight, entry_id))
+            top.sort(reverse=True)
+            node.top = top[:self.top_k]
+
+    def remove(self, key, entry_id):
+        nodes = self._path(key)
+        if not nodes or not nodes[-1].entries or entry_id not in nodes[-1].entries:
+            return
+        del nodes[-1].entries[entry_id]
+
+        # Prune the branch if nothing else lives below it
+        depth = len(nodes) - 1
+        while depth and not nodes[depth].children and not nodes[depth].entries:
+            del nodes[depth - 1].children[key[depth - 1]]
+            depth -= 1
+
+        # Rebuild top lists bottom-up; once a node did not rank the entry, no ancestor does
+        for node in reversed(nodes[:depth + 1]):
+            if not any(item[1] == entry_id for item in node.top):
+                break
+            candidates = [(weight, other) for other, weight in (node.entries or {}).items()]
+            for child in node.children.values():
+                candidates.extend(child.top)
+            node.top = heapq.nlargest(self.top_k, set(candidates))
+
+    def complete(self, prefix):
+        """Return the top_k (weight, entry_id) pairs whose keys start with prefix"""
+        nodes = self._path(prefix)
+        return list(nodes[-1].top) if nodes else []
+
+
+class SuggestIndex:
+    """
+    Typeahead over article titles, category names and frequent terms.
+
+    Titles and category names are indexed under every word-start suffix, so
+    "netw" completes "Neural Networks". Terms come from titles and
+    descriptions and are weighted by how many articles use them.
+    """
+
+    MIN_TERM_ARTICLES = 2
+
+    def __init__(self, top_k=10):
+        self.trie = PrefixTrie(top_k=top_k)
+        self.entries = {}  # entry_id -> (label, kind, url)
+        self._keys = {}  # entry_id -> keys it is indexed under
+        self._article_terms = {}
+        self.term_counts = Counter()
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def keys_for(label):
+        words = label.lower().split()
+        return {' '.join(words[i:]) for i in range(len(words))}
+
+    def _add(self, entry_id, label, kind, url, weight, keys=None):
+        self._remove(entry_id)
+        keys = keys or self.keys_for(label)
+        self.entries[entry_id] = (label, kind, url)
+        self._keys[entry_id] = keys
+        for key in keys:
+            self.trie.insert(key, entry_id, weight)
+
+    def _remove(self, entry_id):
+        for key in self._keys.pop(entry_id, ()):
+            self.trie.remove(key, entry_id)
+        self.entries.pop(entry_id, None)
+
+    def _set_term_count(self, term, delta):
+        self.term_counts[term] += delta
+        count = self.term_counts[term]
+        if count >= self.MIN_TERM_ARTICLES:
+            self._add(f't:{term}', term, 'term', None, math.log1p(count), {term})
+        else:
+            self._remove(f't:{term}')
+            if count <= 0:
+                del self.term_counts[term]
+
+    def add_article(self, article_id, title, slug, description, views=0):
+        with self._lock:
+            url = reverse('article_detail', args=[slug])
+            self._add(f'a:{article_id}', title, 'article', url, 1 + math.log1p(views))
+            terms = set(tokenize(f"{title} {description}"))
+            old_terms = self._article_terms.get(article_id, set())
+            self._article_terms[article_id] = terms
+            for term in terms - old_terms:
+                self._set_term_count(term, 1)
+            for term in old_terms - terms:
+                self._set_term_count(term, -1)
+
+    def remove_article(self, article_id):
+        with self._lock:
+            self._remove(f'a:{article_id}')
+            for term in self._article_terms.pop(article_id, ()):
+                self._set_term_count(term, -1)
+
+    def add_category(self, category_id, name, slug):
+        with self._lock:
+            url = f"{reverse('knowledge_base')}?category={slug}"
+            self._add(f'c:{category_id}', name, 'category', url, 5.0)
+
+    def remove_category(self, category_id):
+        with self._lock:
+            self._remove(f'c:{category_id}')
+
+    def suggest(self, prefix, limit=8):
+        """Return up to limit completions for prefix, best first"""
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix:
+            return []
+        with self._lock:
+            results = []
+            for _, entry_id in self.trie.complete(prefix):
+                if len(prefix) > self.trie.max_depth and not any(
+                    key.startswith(prefix) for key in self._keys.get(entry_id, ())
+                ):
+                    continue
+                label, kind, url = self.entries[entry_id]
+                results.append({'label': label, 'kind': kind, 'url': url})
+                if len(results) == limit:
+                    break
+            return results
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def build_suggest_index():
+    from core.models import Article, Category
+
+    index = SuggestIndex()
+    rows = (
+        Article.objects.filter(is_published=True)
+        .values_list('id', 'title', 'slug', 'description', 'views')
+        .iterator(chunk_size=1000)
+    )
+    for article_id, title, slug, description, views in rows:
+        index.add_article(article_id, title, slug, description, views)
+    for category_id, name, slug in Category.objects.values_list('id', 'name', 'slug'):
+        index.add_category(category_id, name, slug)
+    return index
+
+
+def current_suggest_index():
+    return _index
+
+
+def get_suggest_index():
+    """Return the process-wide typeahead index, building it on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_suggest_index()
+    return _index
+
+
+def reset_suggest_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def _build_in_background():
+    try:
+        get_suggest_index()
+    except Exception:
+        logger.exception("Failed to build the typeahead index")
+    finally:
+        connection.close()
+
+
+def warm_up(**kwargs):
+    """Build the index in the background when the worker serves its first request"""
+    from django.core.signals import request_started
+
+    request_started.disconnect(warm_up, dispatch_uid='warm_suggest_index')
+    threading.Thread(target=_build_in_background, daemon=True).start()
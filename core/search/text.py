@@ -0,0 +1,54 @@
+import re
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a about above after again all am an and any are as at be because been before
+being below between both but by can could did do does doing down during each
+few for from further had has have having he her here hers him his how i if in
+into is it its itself just me more most my no nor not of off on once only or
+other our ours out over own same she should so some such than that the their
+theirs them then there these they this those through to too under until up
+very was we were what when where which while who whom why will with would you
+your yours
+""".split())
+
+
+def tokenize(text):
+    """Lowercase text and split it into search terms, dropping stopwords"""
+    if not text:
+        return []
+    return [
+        token for token in TOKEN_RE.findall(text.lower())
+        if token not in STOPWORDS and len(token) > 1
+    ]
+
+
+# Stopwords that still change what a question asks: negations, wh-words and modals
+QUESTION_TERMS = frozenset("""
+no nor not never what when where which who whom whose why how can could should
+would will shall may might must
+""".split())
+
+# Negative contractions whose stem is not the modal they negate
+IRREGULAR_NEGATIONS = {"won't": "will not", "can't": "can not", "shan't": "shall not"}
+IRREGULAR_NEGATION_RE = re.compile(r"\b(%s)" % '|'.join(map(re.escape, IRREGULAR_NEGATIONS)))
+
+
+def question_terms(text):
+    """The negations, wh-words and modals of a question, which tokenize() drops"""
+    if not text:
+        return frozenset()
+    text = IRREGULAR_NEGATION_RE.sub(lambda m: IRREGULAR_NEGATIONS[m.group(1)], text.lower().replace("\u2019", "'"))
+    words = TOKEN_RE.findall(text.replace("n't", " not"))
+    return frozenset(word for word in words if word in QUESTION_TERMS)
+
+
+def passage_text(title, text, category=''):
+    """Text indexed for a passage; the article title is repeated to boost it"""
+    return f"{title}\n{title}\n{category}\n{text}"
+
+
+def article_text(title, description, content):
+    """Text embedded for a whole article; the title is repeated to boost it"""
+    return f"{title}\n{title}\n{description}\n{content}"
@@ -0,0 +1,207 @@
+import threading
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .chunking import count_published_passages, published_passages
+from .text import tokenize
+
+
+class HashingEmbedder:
+    """
+    Offline embedder that projects unigrams and bigrams into a fixed number of
+    dimensions with signed feature hashing. Vectors are L2-normalised so a dot
+    product is cosine similarity.
+    """
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def features(self, text):
+        tokens = tokenize(text)
+        return Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, count in self.features(text).items():
+                h = zlib.crc32(feature.encode('utf-8'))
+                sign = 1.0 if h & 0x80000000 else -1.0
+                matrix[row, h % self.dim] += sign * (1.0 + np.log(count))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+
+def get_embedder():
+    """Instantiate the embedder class named by SEARCH_EMBEDDER"""
+    return import_string(settings.SEARCH_EMBEDDER)(dim=settings.SEARCH_EMBEDDING_DIM)
+
+
+class VectorIndex:
+    """
+    Exact nearest-neighbour index over one contiguous float32 matrix.
+
+    Rows are kept packed at the front of the matrix: removing a document moves
+    the last row into its slot, so a query is always a single matrix-vector
+    product over matrix[:size].
+    """
+
+    def __init__(self, dim, capacity=1024):
+        self.dim = dim
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.size = 0
+        self._rows = {}  # doc_id -> row
+        self.groups = defaultdict(set)  # group (e.g. article id) -> doc_ids
+        self._doc_group = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, doc_id):
+        return doc_id in self._rows
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= len(self.matrix):
+            return
+        capacity = max(needed, 2 * len(self.matrix))
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self.size] = self.ids[:self.size]
+        self.matrix, self.ids = matrix, ids
+
+    def add(self, doc_ids, vectors, groups=None):
+        """Insert or replace a batch of documents"""
+        with self._lock:
+            self._reserve(len(doc_ids))
+            for position, (doc_id, vector) in enumerate(zip(doc_ids, vectors)):
+                if groups is not None and groups[position] is not None:
+                    self.groups[groups[position]].add(doc_id)
+                    self._doc_group[doc_id] = groups[position]
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self.size
+                    self.size += 1
+                    self._rows[doc_id] = row
+                    self.ids[row] = doc_id
+                self.matrix[row] = vector
+
+    def group_of(self, doc_id):
+        return self._doc_group.get(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def remove_group(self, group):
+        """Remove every document added under group"""
+        with self._lock:
+            for doc_id in list(self.groups.get(group, ())):
+                self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        row = self._rows.pop(doc_id, None)
+        if row is None:
+            return
+        group = self._doc_group.pop(doc_id, None)
+        if group is not None:
+            self.groups[group].discard(doc_id)
+            if not self.groups[group]:
+                del self.groups[group]
+        last = self.size - 1
+        if row != last:
+            moved = int(self.ids[last])
+            self.matrix[row] = self.matrix[last]
+            self.ids[row] = moved
+            self._rows[moved] = row
+        self.size = last
+
+    def search_vector(self, vector, k=10):
+        """Return up to k (doc_id, similarity) pairs, most similar first"""
+        with self._lock:
+            if self.size == 0:
+                return []
+            scores = self.matrix[:self.size] @ vector
+            k = min(k, self.size)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(self.ids[i]), float(scores[i])) for i in top if scores[i] > 0]
+
+
+_index = None
+_embedder = None
+_index_lock = threading.Lock()
+
+
+def embedder():
+    global _embedder
+    if _embedder is None:
+        _embedder = get_embedder()
+    return _embedder
+
+
+def build_passage_vectors(batch_size=1000, index=None):
+    """Embed the passages of every published article, batch by batch, into index (by default a new VectorIndex)"""
+    if index is None:
+        index = VectorIndex(embedder().dim)
+    batch = []
+    for row in published_passages(batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            add_passages(index, batch)
+            batch = []
+    add_passages(index, batch)
+    return index
+
+
+def add_passages(index, rows):
+    """Embed (chunk_id, article_id, text) rows in one batch and add them to index"""
+    if not rows:
+        return
+    chunk_ids, article_ids, texts = zip(*rows)
+    index.add(chunk_ids, embedder().embed(texts), groups=article_ids)
+
+
+def current_passage_vectors():
+    """Return the process-wide vector index if it has been built, else None"""
+    return _index
+
+
+def get_passage_vectors():
+    """
+    Return the process-wide vector index, building it on first use.
+
+    Large corpora get an approximate IVF index (see SEARCH_ANN) instead of the
+    exact one, so a query only scores a fraction of the passage vectors. It is
+    built straight from batches of passages, never holding the exact matrix too.
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                config = settings.SEARCH_ANN
+                count = count_published_passages() if config['enabled'] else 0
+                if count and count >= config['min_vectors']:
+                    from .ann import build_passage_ivf
+                    _index = build_passage_ivf(count, nlist=config['nlist'] or None, nprobe=config['nprobe'])
+                else:
+                    _index = build_passage_vectors()
+    return _index
+
+
+def reset_passage_vectors():
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def search(query, k=10):
+    vector = embedder().embed([query])[0]
+    return get_passage_vectors().search_vector(vector, k)
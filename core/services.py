@@ -1,19 +1,18 @@
-import google.generativeai as genai
-from django.conf import settings
+from .llm import get_provider
+from .prompts import as_passages, context_budget, pack_context
 
 class ChatService:
     def __init__(self):
-        """Initialize Gemini AI client (FREE API)"""
-        genai.configure(api_key=settings.GEMINI_API_KEY)
-        self.model = genai.GenerativeModel('gemini-1.5-flash')
+        """Use the process-wide client of the configured LLM provider"""
+        self.provider = get_provider()
     
     def get_ai_response(self, user_message, context=None, conversation_history=None):
         """
-        Get response from Google Gemini API (FREE)
+        Get response from the configured LLM provider
         
         Args:
             user_message: The current user message
-            context: Knowledge base context (optional)
+            context: Ranked knowledge base passages or a context string (optional)
             conversation_history: List of previous Message objects (optional)
         
         Returns:
@@ -22,25 +21,28 @@ class ChatService:
         # Build the prompt
         prompt = "You are a helpful AI assistant with access to a knowledge base. Provide accurate, helpful, and friendly responses.\n\n"
         
-        # Add context from knowledge base if provided
-        if context:
-            prompt += f"Relevant information from knowledge base:\n{context}\n\n"
-        
         # Add conversation history if provided (last 5 messages to save tokens)
+        history = ""
         if conversation_history:
-            prompt += "Previous conversation:\n"
+            history = "Previous conversation:\n"
             for msg in conversation_history[-5:]:
                 role = "User" if msg.role == "user" else "Assistant"
-                prompt += f"{role}: {msg.content}\n"
-            prompt += "\n"
+                history += f"{role}: {msg.content}\n"
+            history += "\n"
+        
+        # Add context from knowledge base, packed into what is left of the token budget
+        packed = pack_context(as_passages(context), context_budget(prompt, history, user_message))
+        if packed:
+            prompt += f"Relevant information from knowledge base:\n{packed}\n\n"
+        
+        prompt += history
         
         # Add current user message
         prompt += f"User: {user_message}\nAssistant:"
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self.provider.generate(prompt)
         
         except Exception as e:
-            print(f"Gemini API Error: {str(e)}")
-            raise Exception(f"Error calling Gemini API: {str(e)}")
\ No newline at end of file
+            print(f"{self.provider.name} API Error: {str(e)}")
+            raise Exception(f"Error calling {self.provider.name} API: {str(e)}")
\ No newline at end of file
@@ -1,7 +1,12 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile, UserSettings
+from .models import UserProfile, UserSettings, Article, Category
+from .search.chunking import chunk_article
+from .search.indexing import (
+    INDEXED_FIELDS, reindex_articles, remove_articles, reindex_category, remove_category,
+)
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
@@ -18,4 +23,34 @@ def save_user_profile(sender, instance, **kwargs):
     if not kwargs.get('created', False):
         # Ensure profile and settings exist
         UserProfile.objects.get_or_create(user=instance)
-        UserSettings.objects.get_or_create(user=instance)
\ No newline at end of file
+        UserSettings.objects.get_or_create(user=instance)
+
+@receiver(post_save, sender=Article)
+def index_article_on_save(sender, instance, update_fields=None, **kwargs):
+    """Re-chunk a saved article and refresh only its entries in the search indexes"""
+    if update_fields is not None and not INDEXED_FIELDS & set(update_fields):
+        return
+    chunk_article(instance)
+    article_id = instance.pk
+    transaction.on_commit(lambda: reindex_articles([article_id]))
+
+@receiver(post_delete, sender=Article)
+def unindex_article_on_delete(sender, instance, **kwargs):
+    """Drop a deleted article's passages (deleting a Category cascades here too)"""
+    article_id = instance.pk
+    transaction.on_commit(lambda: remove_articles([article_id]))
+
+@receiver(post_save, sender=Category)
+def reindex_category_on_save(sender, instance, created, **kwargs):
+    """Update the typeahead entry; the name is also indexed with each passage, so refresh its articles"""
+    category_id, name, slug = instance.pk, instance.name, instance.slug
+    transaction.on_commit(lambda: reindex_category(category_id, name, slug))
+    if created:
+        return
+    article_ids = list(instance.articles.values_list('id', flat=True))
+    transaction.on_commit(lambda: reindex_articles(article_ids))
+
+@receiver(post_delete, sender=Category)
+def unindex_category_on_delete(sender, instance, **kwargs):
+    category_id = instance.pk
+    transaction.on_commit(lambda: remove_category(category_id))
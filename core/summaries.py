@@ -0,0 +1,116 @@
+"""
+Rolling conversation summaries.
+
+Chat prompts carry a conversation's summary plus as many of its newest
+messages as fit PROMPT_HISTORY_TOKENS, so their size stays the same however
+long the conversation runs. After each exchange, maybe_summarize() checks
+whether CONVERSATION_SUMMARY['every'] messages older than the newest
+'keep_recent' are still unsummarized, and if so a background thread asks the
+model, at background priority, to fold them into Conversation.summary.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection
+
+from . import admission
+from .llm import get_provider
+from .models import Conversation, Message
+from .prompts import CHARS_PER_TOKEN, trim_to_sentences
+
+logger = logging.getLogger(__name__)
+
+# A single long message contributes at most this much to a summary request
+MAX_MESSAGE_CHARS = 2000
+
+SUMMARY_PROMPT = """Update the running summary of a conversation between a user and an AI Knowledge Assistant.
+Keep the facts, decisions, open questions and user preferences a later answer may need, and drop pleasantries.
+Reply with the updated summary only, in at most {words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+_running = set()
+_running_lock = threading.Lock()
+
+
+def unsummarized(conversation):
+    """The conversation's messages not yet folded into its summary"""
+    messages = Message.objects.filter(conversation=conversation)
+    if conversation.summarized_until is not None:
+        messages = messages.filter(timestamp__gt=conversation.summarized_until)
+    return messages
+
+
+def recent_messages(conversation, until=None, limit=10):
+    """Newest first: the latest unsummarized messages, optionally only those up to `until`"""
+    messages = unsummarized(conversation)
+    if until is not None:
+        messages = messages.filter(timestamp__lte=until)
+    return list(messages.order_by('-timestamp')[:limit])
+
+
+def summary_prompt(summary, messages):
+    lines = []
+    for msg in messages:
+        role = "User" if msg.role == "user" else "Assistant"
+        lines.append(f"{role}: {trim_to_sentences(msg.content, MAX_MESSAGE_CHARS) or msg.content[:MAX_MESSAGE_CHARS]}")
+    words = settings.CONVERSATION_SUMMARY['max_tokens'] * 3 // 4
+    return SUMMARY_PROMPT.format(words=words, summary=summary or "(none yet)", messages="\n".join(lines))
+
+
+def summarize(conversation_id):
+    """Fold the unsummarized messages older than the newest keep_recent into the summary; True if it changed"""
+    config = settings.CONVERSATION_SUMMARY
+    provider = get_provider()
+    if not provider.available:
+        return False
+    conversation = Conversation.objects.select_related('user').get(id=conversation_id)
+    pending = list(unsummarized(conversation).order_by('timestamp'))
+    fold = pending[:len(pending) - config['keep_recent']]
+    if len(fold) < config['every']:
+        return False
+
+    prompt = summary_prompt(conversation.summary, fold)
+    admission.admit(conversation.user, prompt, 'background')
+    summary = provider.generate(prompt).strip()
+    max_chars = config['max_tokens'] * CHARS_PER_TOKEN
+    summary = trim_to_sentences(summary, max_chars) or summary[:max_chars]
+
+    # Conditional, so a concurrent run (e.g. in another process) cannot fold the same messages twice
+    return bool(Conversation.objects.filter(
+        id=conversation.id, summarized_until=conversation.summarized_until
+    ).update(summary=summary, summarized_until=fold[-1].timestamp))
+
+
+def maybe_summarize(conversation):
+    """Update the summary on a daemon thread once enough messages are waiting"""
+    config = settings.CONVERSATION_SUMMARY
+    if not config['enabled']:
+        return
+    if unsummarized(conversation).count() < config['every'] + config['keep_recent']:
+        return
+    with _running_lock:
+        if conversation.id in _running:
+            return
+        _running.add(conversation.id)
+
+    def run():
+        try:
+            summarize(conversation.id)
+        except admission.RateLimited as e:
+            logger.info("Summary of conversation %s postponed: %s", conversation.id, e.reason)
+        except Exception:
+            logger.exception("Failed to summarize conversation %s", conversation.id)
+        finally:
+            with _running_lock:
+                _running.discard(conversation.id)
+            connection.close()
+
+    threading.Thread(target=run, daemon=True).start()
@@ -0,0 +1,58 @@
+import re
+
+from django.test import SimpleTestCase
+
+from .prompts import pack_context
+from .search import answer_cache
+from .search.answer_cache import SemanticAnswerCache
+from .search.text import question_terms
+
+CONTEXT = [{'article_id': 1, 'start': 0}, {'article_id': 2, 'start': 400}]
+
+
+class AnswerCacheTests(SimpleTestCase):
+    def cached(self, question):
+        answers = SemanticAnswerCache(threshold=0.9)
+        answers.store(
+            answer_cache.embed_question(question), answer_cache.bucket(question, CONTEXT),
+            'cached answer', {1, 2}, 100,
+        )
+        return answers
+
+    def lookup(self, answers, question):
+        return answers.lookup(answer_cache.embed_question(question), answer_cache.bucket(question, CONTEXT))
+
+    def test_rephrased_question_hits(self):
+        answers = self.cached("What is the refund policy?")
+        self.assertIsNotNone(self.lookup(answers, "what is the  refund policy"))
+
+    def test_wh_variant_misses(self):
+        answers = self.cached("What is the refund policy?")
+        self.assertIsNone(self.lookup(answers, "Why is there a refund policy?"))
+
+    def test_negated_question_misses(self):
+        answers = self.cached("How do I enable two-factor auth")
+        self.assertIsNone(self.lookup(answers, "How do I not enable two-factor auth"))
+        self.assertIsNone(self.lookup(answers, "How don't I enable two-factor auth"))
+
+    def test_modal_variant_misses(self):
+        answers = self.cached("Can I delete my account")
+        self.assertIsNone(self.lookup(answers, "Should I delete my account"))
+
+    def test_irregular_negations_keep_their_modal(self):
+        self.assertEqual(question_terms("Why won't it sync?"), {'why', 'will', 'not'})
+        self.assertEqual(question_terms("I can\u2019t log in"), {'can', 'not'})
+        self.assertEqual(question_terms("Shan't we"), {'shall', 'not'})
+        answers = self.cached("Can I delete my account")
+        self.assertIsNone(self.lookup(answers, "Can't I delete my account"))
+
+
+class PackContextTests(SimpleTestCase):
+    def test_overlapping_passages_are_neither_repeated_nor_lost(self):
+        article = ' '.join(f"Sentence {i} is about topic {i} in some detail." for i in range(40))
+        passages = [
+            {'article_id': 1, 'title': 'T', 'start': start, 'text': article[start:end]}
+            for start, end in [(300, 900), (851, 1500), (100, 420)]
+        ]
+        numbers = [int(n) for n in re.findall(r'Sentence (\d+) ', pack_context(passages, 10000).text)]
+        self.assertEqual(sorted(numbers), list(range(min(numbers), max(numbers) + 1)))
@@ -1,5 +1,9 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# The chat API runs as native async views when served over ASGI
+chat_views = async_views if settings.CHAT_ASYNC_VIEWS else views
 
 urlpatterns = [
     # Home & Authentication
@@ -27,14 +31,21 @@ urlpatterns = [
     path('contact/success/', views.contact_success_view, name='contact_success'),
     
     # Chat API Endpoints
-    path('api/conversations/', views.list_conversations, name='api_list_conversations'),
-    path('api/conversation/create/', views.create_conversation, name='api_create_conversation'),
-    path('api/conversation/<int:conversation_id>/', views.get_conversation_messages, name='api_get_messages'),
-    path('api/conversation/<int:conversation_id>/delete/', views.delete_conversation, name='api_delete_conversation'),
-    path('api/message/send/', views.send_message, name='api_send_message'),
+    path('api/conversations/', chat_views.list_conversations, name='api_list_conversations'),
+    path('api/conversation/create/', chat_views.create_conversation, name='api_create_conversation'),
+    path('api/conversation/<int:conversation_id>/', chat_views.get_conversation_messages, name='api_get_messages'),
+    path('api/conversation/<int:conversation_id>/delete/', chat_views.delete_conversation, name='api_delete_conversation'),
+    path('api/message/send/', chat_views.send_message, name='api_send_message'),
+    path('api/message/stream/', chat_views.send_message_stream, name='api_stream_message'),
+    path('api/message/job/<int:job_id>/', views.message_job, name='api_message_job'),
     
     # Settings & Notifications API
     path('api/settings/update/', views.update_settings, name='api_update_settings'),
     path('api/notifications/clear/', views.clear_notifications, name='api_clear_notifications'),
     path('api/notification/<int:notification_id>/read/', views.mark_notification_read, name='api_mark_notification_read'),
+    
+    # Search API
+    path('api/articles/', views.knowledge_base_articles, name='api_articles'),
+    path('api/search/suggest/', views.search_suggest, name='api_search_suggest'),
+    path('api/search/stats/', views.search_stats, name='api_search_stats'),
 ]
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Per-reply token, latency and cache accounting.
+
+The chat paths fill a usage dict while they answer (see the `usage` argument
+of utils.get_ai_response and utils.search_knowledge_base) and pass it to
+record() with the saved assistant message. Rows are buffered in memory and a
+daemon thread writes them with one bulk_create once
+USAGE_ACCOUNTING['batch_size'] are waiting or every 'flush_interval' seconds,
+so a reply never waits on the insert. Rows still buffered when the process
+is killed are lost; a normal exit flushes them.
+"""
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+from .models import Message, MessageUsage
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+    'model', 'prompt_tokens', 'completion_tokens', 'retrieval_ms', 'generation_ms',
+    'answer_cache_hit', 'search_cache_hit',
+)
+
+_pending = []
+_pending_lock = threading.Lock()
+_wake = threading.Event()
+_flusher = None
+
+
+def record(message, user, usage):
+    """Buffer the usage row of an assistant reply"""
+    config = settings.USAGE_ACCOUNTING
+    if not config['enabled']:
+        return
+    row = MessageUsage(
+        message_id=message.id, user_id=getattr(user, 'pk', user),
+        **{field: value for field, value in usage.items() if field in FIELDS}
+    )
+    with _pending_lock:
+        _pending.append(row)
+        full = len(_pending) >= config['batch_size']
+    start_flusher()
+    if full:
+        _wake.set()
+
+
+def flush():
+    """Write every buffered row now; returns how many were written"""
+    with _pending_lock:
+        rows = _pending[:]
+        _pending.clear()
+    if not rows:
+        return 0
+    # Skip replies deleted while their row was buffered, e.g. with their conversation
+    existing = set(Message.objects.filter(id__in=[row.message_id for row in rows]).values_list('id', flat=True))
+    rows = [row for row in rows if row.message_id in existing]
+    MessageUsage.objects.bulk_create(rows, ignore_conflicts=True)
+    return len(rows)
+
+
+def _flush_periodically():
+    while True:
+        _wake.wait(settings.USAGE_ACCOUNTING['flush_interval'])
+        _wake.clear()
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            logger.exception("Failed to write message usage")
+
+
+def start_flusher():
+    global _flusher
+    if _flusher is None:
+        with _pending_lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_periodically, name='usage-flusher', daemon=True)
+                _flusher.start()
+                atexit.register(flush)
+
+
+def rollup(queryset=None, by=('day', 'user__username', 'model')):
+    """Reply counts, token totals, mean latencies and cache hits grouped by day, user and model"""
+    queryset = MessageUsage.objects.all() if queryset is None else queryset
+    return (
+        queryset.annotate(day=TruncDate('created_at'))
+        .values(*by)
+        .annotate(
+            replies=Count('id'),
+            prompt_tokens=Sum('prompt_tokens'),
+            completion_tokens=Sum('completion_tokens'),
+            avg_retrieval_ms=Avg('retrieval_ms'),
+            avg_generation_ms=Avg('generation_ms'),
+            answer_cache_hits=Count('id', filter=Q(answer_cache_hit=True)),
+            search_cache_hits=Count('id', filter=Q(search_cache_hit=True)),
+        )
+        .order_by(*[f'-{field}' if field == 'day' else field for field in by])
+    )
+
+
+def top_conversations(queryset=None, limit=10):
+    """The conversations that used the most tokens"""
+    queryset = MessageUsage.objects.all() if queryset is None else queryset
+    return (
+        queryset.values('message__conversation', 'message__conversation__title', 'user__username')
+        .annotate(
+            replies=Count('id'),
+            tokens=Sum(F('prompt_tokens') + F('completion_tokens')),
+            generation_ms=Sum('generation_ms'),
+        )
+        .order_by('-tokens')[:limit]
+    )
@@ -1,88 +1,290 @@
-import google.generativeai as genai
+import functools
+import logging
+import time
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
-from django.db.models import Q
-from .models import Article
+from . import admission, summaries
+from .llm import ProviderUnavailable, get_provider
+from .models import ArticleChunk, Notification, UserProfile, UserSettings
+from .prompts import as_passages, context_budget, estimate_tokens, fit_history, pack_context
+from .search import answer_cache, result_cache
+from .search.indexing import ensure_current
+from .search.ranking import rank_passages
 
-# Configure Gemini API
-if settings.GEMINI_API_KEY:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
+logger = logging.getLogger(__name__)
 
-def get_ai_response(user_message, context="", conversation_history=None):
-    """Get AI response using Google Gemini API"""
+def build_prompt(user_message, context="", conversation_history=None, summary=""):
+    """Assemble the full prompt: instructions, conversation summary and recent history, packed context and the question"""
     system_message = """You are a helpful AI Knowledge Assistant. Provide accurate, 
     detailed responses. When context is provided, use it to enhance your answers."""
     
     # Build the prompt with context and history
     prompt_parts = [system_message]
     
-    if conversation_history:
-        # Convert QuerySet to list and get last 5 messages in correct order
-        history_list = list(conversation_history)
-        history_list.reverse()  # Reverse to get chronological order
-        recent_messages = history_list[:5]
-        
+    if summary:
+        prompt_parts.append(f"\nConversation Summary: {summary}")
+    
+    # Newest first; the question itself is already saved as the newest message and goes last
+    history = list(conversation_history or [])
+    if history and history[0].role == 'user' and history[0].content == user_message:
+        history = history[1:]
+    history_lines = fit_history(history, settings.PROMPT_HISTORY_TOKENS - estimate_tokens(summary))
+    if history_lines:
         prompt_parts.append("\nConversation History:")
-        for msg in recent_messages:
-            role = "User" if msg.role == "user" else "Assistant"
-            prompt_parts.append(f"{role}: {msg.content}")
+        prompt_parts.extend(history_lines)
     
-    if context:
-        prompt_parts.append(f"\nContext from Knowledge Base: {context}")
+    # Fill whatever is left of the token budget with the best passages
+    packed = pack_context(as_passages(context), context_budget(*prompt_parts, user_message))
+    if packed:
+        prompt_parts.append(f"\nContext from Knowledge Base: {packed}")
+    logger.debug("Packed %d passages, %d tokens for the prompt", len(packed.passages), packed.tokens)
     
     prompt_parts.append(f"\nUser: {user_message}")
     prompt_parts.append("\nAssistant:")
     
-    full_prompt = "\n".join(prompt_parts)
+    return "\n".join(prompt_parts)
+
+def demo_response(user_message):
+    return f"Demo mode: Received '{user_message}'. Add an API key for LLM_PROVIDER '{settings.LLM_PROVIDER}' for full functionality."
+
+def note_usage(usage, **values):
+    """Record accounting values in a caller's usage dict, if it passed one"""
+    if usage is not None:
+        usage.update(values)
+
+def elapsed_ms(started):
+    return (time.perf_counter() - started) * 1000
+
+def cached_answer(user_message, context, conversation_history, summary=""):
+    """
+    Return (use_cache, answer): whether this question may use the semantic
+    answer cache, and the cached answer if there is one. Only the opening
+    question of a conversation qualifies; follow-ups depend on the history.
+    """
+    if not settings.ANSWER_CACHE['enabled'] or summary or len(list(conversation_history or [])) > 1:
+        return False, None
+    return True, answer_cache.lookup(user_message, context)
+
+def get_ai_response(user_message, context="", conversation_history=None, summary="", user=None, priority='interactive',
+                    usage=None):
+    """
+    Get AI response from the configured LLM provider. Raises RateLimited when
+    the call is not admitted and ProviderUnavailable while its circuit is open.
+    If a usage dict is given, the model, token estimates, generation time,
+    answer cache hit and any generation error are written into it for
+    core/usage.py.
+    """
+    use_cache, cached = cached_answer(user_message, context, conversation_history, summary)
+    if cached is not None:
+        note_usage(usage, answer_cache_hit=True)
+        return cached
+    full_prompt = build_prompt(user_message, context, conversation_history, summary)
+    provider = get_provider()
     
+    if not provider.available:
+        return demo_response(user_message)
+    admit = functools.partial(admission.admit, user, full_prompt, priority)
+    note_usage(usage, model=provider.model_name, prompt_tokens=estimate_tokens(full_prompt))
+    started = time.perf_counter()
     try:
-        if not settings.GEMINI_API_KEY:
-            return f"Demo mode: Received '{user_message}'. Add Gemini API key for full functionality."
-        
-        # FIXED: Use correct model name without 'models/' prefix
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Generate response with safety settings
-        generation_config = {
-            'temperature': 0.7,
-            'top_p': 1,
-            'top_k': 1,
-            'max_output_tokens': 2048,
-        }
-        
-        response = model.generate_content(
-            full_prompt,
-            generation_config=generation_config
-        )
-        
-        return response.text
-        
+        answer = provider.generate_admitted(full_prompt, admit)
+    except (admission.RateLimited, ProviderUnavailable):
+        raise
     except Exception as e:
-        error_msg = str(e)
-        
-        # If model not found, try listing available models
-        if "404" in error_msg or "not found" in error_msg.lower():
-            try:
-                available_models = [m.name for m in genai.list_models()]
-                return f"Model error. Available models: {', '.join(available_models[:5])}. Please update utils.py with a valid model name."
-            except:
-                return f"Error: Unable to access Gemini API. Please check your API key. Details: {error_msg}"
-        
-        return f"Error: {error_msg}"
-
-def search_knowledge_base(query, limit=3):
-    """Search knowledge base for relevant articles"""
-    articles = Article.objects.filter(
-        Q(title__icontains=query) |
-        Q(content__icontains=query) |
-        Q(description__icontains=query),
-        is_published=True
-    )[:limit]
+        note_usage(usage, generation_ms=elapsed_ms(started), error=str(e))
+        if provider.is_rate_limit(e):
+            raise admission.throttle() from e
+        return provider.describe_error(e)
+    generation_ms = elapsed_ms(started)
+    note_usage(usage, completion_tokens=estimate_tokens(answer), generation_ms=generation_ms)
+    if use_cache:
+        answer_cache.store(user_message, context, answer, generation_ms)
+    return answer
+
+def stream_ai_response(user_message, context="", conversation_history=None, summary="", user=None, priority='interactive',
+                       usage=None):
+    """
+    Like get_ai_response, but return a generator of the answer's pieces as
+    the model generates them. The stream is run up to its first piece before
+    this returns, so RateLimited and ProviderUnavailable (from admission, an
+    open circuit or an upstream quota error before any text) are raised here
+    and never midway through a stream.
+    """
+    use_cache, cached = cached_answer(user_message, context, conversation_history, summary)
+    if cached is not None:
+        note_usage(usage, answer_cache_hit=True)
+        return _iter([cached])
+    full_prompt = build_prompt(user_message, context, conversation_history, summary)
+    provider = get_provider()
     
-    context = ""
-    for article in articles:
-        context += f"\n\nArticle: {article.title}\n{article.content[:500]}..."
+    if not provider.available:
+        return _iter([demo_response(user_message)])
+    admit = functools.partial(admission.admit, user, full_prompt, priority)
+    note_usage(usage, model=provider.model_name, prompt_tokens=estimate_tokens(full_prompt))
+    return _started(_stream_answer(provider, full_prompt, admit, user_message, context, use_cache, usage))
+
+def _stream_answer(provider, full_prompt, admit, user_message, context, use_cache, usage):
+    started = time.perf_counter()
+    parts = []
+    try:
+        for text in provider.stream_admitted(full_prompt, admit):
+            parts.append(text)
+            yield text
+    except Exception as e:
+        note_usage(usage, error=str(e))
+        if not parts and isinstance(e, (admission.RateLimited, ProviderUnavailable)):
+            raise
+        if provider.is_rate_limit(e):
+            if not parts:
+                raise admission.throttle() from e
+            error = str(admission.throttle())
+        else:
+            error = provider.describe_error(e)
+        yield ("\n\n" if parts else "") + error
+        return
+    finally:
+        note_usage(usage, completion_tokens=estimate_tokens(''.join(parts)), generation_ms=elapsed_ms(started))
+    if use_cache:
+        answer_cache.store(user_message, context, ''.join(parts), elapsed_ms(started))
+
+async def aget_ai_response(user_message, context="", conversation_history=None, summary="", user=None, priority='interactive',
+                           usage=None):
+    """Async get_ai_response: awaits the model instead of blocking a worker thread"""
+    use_cache, cached = cached_answer(user_message, context, conversation_history, summary)
+    if cached is not None:
+        note_usage(usage, answer_cache_hit=True)
+        return cached
+    full_prompt = build_prompt(user_message, context, conversation_history, summary)
+    provider = get_provider()
+    
+    if not provider.available:
+        return demo_response(user_message)
+    admit = functools.partial(aadmit, user, full_prompt, priority)
+    note_usage(usage, model=provider.model_name, prompt_tokens=estimate_tokens(full_prompt))
+    started = time.perf_counter()
+    try:
+        answer = await provider.agenerate_admitted(full_prompt, admit)
+    except (admission.RateLimited, ProviderUnavailable):
+        raise
+    except Exception as e:
+        note_usage(usage, generation_ms=elapsed_ms(started), error=str(e))
+        if provider.is_rate_limit(e):
+            raise admission.throttle() from e
+        return await sync_to_async(provider.describe_error)(e)
+    generation_ms = elapsed_ms(started)
+    note_usage(usage, completion_tokens=estimate_tokens(answer), generation_ms=generation_ms)
+    if use_cache:
+        answer_cache.store(user_message, context, answer, generation_ms)
+    return answer
+
+async def astream_ai_response(user_message, context="", conversation_history=None, summary="", user=None, priority='interactive',
+                              usage=None):
+    """Async stream_ai_response: returns an async generator of the answer's pieces, started like stream_ai_response's"""
+    use_cache, cached = cached_answer(user_message, context, conversation_history, summary)
+    if cached is not None:
+        note_usage(usage, answer_cache_hit=True)
+        return _aiter([cached])
+    full_prompt = build_prompt(user_message, context, conversation_history, summary)
+    provider = get_provider()
     
-    return context
+    if not provider.available:
+        return _aiter([demo_response(user_message)])
+    admit = functools.partial(aadmit, user, full_prompt, priority)
+    note_usage(usage, model=provider.model_name, prompt_tokens=estimate_tokens(full_prompt))
+    return await _astarted(_astream_answer(provider, full_prompt, admit, user_message, context, use_cache, usage))
+
+async def _astream_answer(provider, full_prompt, admit, user_message, context, use_cache, usage):
+    started = time.perf_counter()
+    parts = []
+    try:
+        async for text in provider.astream_admitted(full_prompt, admit):
+            parts.append(text)
+            yield text
+    except Exception as e:
+        note_usage(usage, error=str(e))
+        if not parts and isinstance(e, (admission.RateLimited, ProviderUnavailable)):
+            raise
+        if provider.is_rate_limit(e):
+            if not parts:
+                raise admission.throttle() from e
+            error = str(admission.throttle())
+        else:
+            error = await sync_to_async(provider.describe_error)(e)
+        yield ("\n\n" if parts else "") + error
+        return
+    finally:
+        note_usage(usage, completion_tokens=estimate_tokens(''.join(parts)), generation_ms=elapsed_ms(started))
+    if use_cache:
+        answer_cache.store(user_message, context, ''.join(parts), elapsed_ms(started))
+
+def _iter(pieces):
+    yield from pieces
+
+async def _aiter(pieces):
+    for text in pieces:
+        yield text
+
+def _started(pieces):
+    """Run a stream up to its first piece, so an error before any text is raised to the caller"""
+    first = next(pieces, None)
+    return _resume(first, pieces)
+
+def _resume(first, pieces):
+    try:
+        if first is not None:
+            yield first
+            yield from pieces
+    finally:
+        pieces.close()
+
+async def _astarted(pieces):
+    try:
+        first = await pieces.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return _aresume(first, pieces)
+
+async def _aresume(first, pieces):
+    try:
+        if first is not None:
+            yield first
+            async for text in pieces:
+                yield text
+    finally:
+        await pieces.aclose()
+
+async def aadmit(user, full_prompt, priority):
+    """admission.admit in a pool thread, so waiting for quota never blocks the event loop"""
+    await sync_to_async(admission.admit, thread_sensitive=False)(user, full_prompt, priority)
+
+def search_knowledge_base(query, limit=None, usage=None):
+    """Search knowledge base for the most relevant passages, best match first"""
+    limit = limit or settings.SEARCH_CONTEXT_PASSAGES
+    started = time.perf_counter()
+    computed = []
+    
+    def compute():
+        computed.append(True)
+        return _rank_passages(query, limit)
+    
+    passages = result_cache.get_or_compute(query, limit, compute)
+    note_usage(usage, retrieval_ms=elapsed_ms(started), search_cache_hit=not computed)
+    return passages
+
+def _rank_passages(query, limit):
+    ensure_current()
+    hits = rank_passages(query, k=limit).hits
+    found = ArticleChunk.objects.filter(article__is_published=True).in_bulk([chunk_id for chunk_id, _ in hits])
+    return [
+        {
+            'article_id': found[chunk_id].article_id,
+            'title': found[chunk_id].title,
+            'text': found[chunk_id].text,
+            'start': found[chunk_id].start,
+        }
+        for chunk_id, _ in hits if chunk_id in found
+    ]
 
 def generate_conversation_title(first_message):
     """Generate title from first message"""
@@ -90,4 +292,30 @@ def generate_conversation_title(first_message):
     title = ' '.join(words)
     if len(first_message.split()) > 6:
         title += '...'
-    return title
\ No newline at end of file
+    return title
+
+def record_exchange(user, conversation, user_message):
+    """Update the conversation, profile stats and notifications after an answer"""
+    # Update conversation title if first exchange
+    if conversation.message_count() == 2:
+        conversation.title = generate_conversation_title(user_message)
+    conversation.preview = user_message[:100]
+    # Not the summary fields, which a background summary may have updated meanwhile
+    conversation.save(update_fields=['title', 'preview', 'updated_at'])
+    
+    # Update user profile stats
+    profile, created = UserProfile.objects.get_or_create(user=user)
+    profile.total_messages += 2
+    profile.save()
+    
+    # FIXED: Use get_or_create for settings
+    user_settings, created = UserSettings.objects.get_or_create(user=user)
+    if user_settings.chat_notifications:
+        Notification.objects.create(
+            user=user,
+            title="AI Response Received",
+            message=f"Your question about '{user_message[:50]}...' has been answered.",
+            notification_type='chat'
+        )
+    
+    summaries.maybe_summarize(conversation)
@@ -5,12 +5,14 @@ from django.contrib.auth import update_session_auth_hash
 from django.contrib.auth.hashers import check_password, make_password
 from django.contrib import messages
 from django.db.models import Q
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.core.mail import send_mail, EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
+from django.utils.text import Truncator
+from django.urls import reverse
 from django.conf import settings
 from django.core.cache import cache
 from django.contrib.auth.models import User
@@ -19,10 +21,20 @@ import json
 import os
 import random
 import string
+import time
 
-from .models import Article, Category, Conversation, Message, UserProfile, Notification, UserSettings, Enquiry, EmailOTP
+from .models import Article, Category, ChatJob, Conversation, Message, UserProfile, Notification, UserSettings, Enquiry, EmailOTP, RelatedArticle
 from .forms import SignUpForm, LoginForm, EnquiryForm
-from .utils import get_ai_response, search_knowledge_base, generate_conversation_title
+from .llm import ProviderUnavailable, provider_stats
+from .utils import get_ai_response, stream_ai_response, search_knowledge_base, record_exchange
+from . import admission, jobs
+from . import usage as usage_log
+from .admission import RateLimited
+from .search import answer_cache, fts, result_cache
+from .summaries import recent_messages
+from .search.suggest import get_suggest_index
+from .search.indexing import ensure_current
+from .pagination import keyset_page, ranked_page
 
 # ============================================
 # SENDGRID EMAIL HELPER
@@ -481,28 +493,57 @@ def settings_view(request):
     
     return render(request, 'core/settings.html', context)
 
-@login_required
-def knowledge_base(request):
-    categories = Category.objects.all()
-    articles = Article.objects.filter(is_published=True)
+def get_knowledge_base_page(request):
+    """Published articles for the knowledge base listing, one page at a time"""
+    articles = Article.objects.filter(is_published=True).select_related('category').defer('content')
     
     if request.GET.get('category'):
         articles = articles.filter(category__slug=request.GET.get('category'))
     
+    page_size = settings.KNOWLEDGE_BASE_PAGE_SIZE
+    cursor = request.GET.get('cursor')
     if request.GET.get('q'):
-        query = request.GET.get('q')
-        articles = articles.filter(
-            Q(title__icontains=query) |
-            Q(description__icontains=query) |
-            Q(content__icontains=query)
+        return ranked_page(
+            fts.filter_articles(articles, request.GET.get('q'), category=request.GET.get('category')),
+            cursor, page_size,
         )
+    return keyset_page(articles, cursor, page_size)
+
+@login_required
+def knowledge_base(request):
+    articles, next_cursor = get_knowledge_base_page(request)
     
     return render(request, 'core/knowledge_base.html', {
-        'categories': categories,
+        'categories': Category.objects.all(),
         'articles': articles,
+        'next_cursor': next_cursor,
         'search_query': request.GET.get('q', ''),
     })
 
+@login_required
+@require_http_methods(["GET"])
+def knowledge_base_articles(request):
+    """JSON pages of the knowledge base listing, for infinite scroll"""
+    articles, next_cursor = get_knowledge_base_page(request)
+    return JsonResponse({
+        'articles': [
+            {
+                'title': article.title,
+                'slug': article.slug,
+                'url': reverse('article_detail', args=[article.slug]),
+                'description': Truncator(article.description).words(20),
+                'read_time': article.read_time,
+                'category': {
+                    'name': article.category.name,
+                    'icon': article.category.icon,
+                    'color': article.category.color,
+                },
+            }
+            for article in articles
+        ],
+        'next_cursor': next_cursor,
+    })
+
 @login_required
 
 @login_required
@@ -510,7 +551,7 @@ def article_detail(request, slug):
     """Article detail view - FIXED VERSION"""
     article = get_object_or_404(Article, slug=slug, is_published=True)
     article.views += 1
-    article.save()
+    article.save(update_fields=['views'])
     
     # Add to user's read articles
     request.user.profile.articles_read.add(article)
@@ -525,10 +566,16 @@ def article_detail(request, slug):
             notification_type='article'
         )
     
-    related_articles = Article.objects.filter(
-        category=article.category,
-        is_published=True
-    ).exclude(id=article.id)[:3]
+    # Precomputed by core.search.related; fall back to the same category until it has run
+    related_articles = [
+        link.related for link in
+        RelatedArticle.objects.filter(article=article, related__is_published=True).select_related('related')
+    ]
+    if not related_articles:
+        related_articles = Article.objects.filter(
+            category=article.category,
+            is_published=True
+        ).exclude(id=article.id)[:settings.RELATED_ARTICLES_COUNT]
     
     return render(request, 'core/article_detail.html', {
         'article': article,
@@ -633,10 +680,22 @@ def send_message(request):
             content=user_message
         )
         
+        # Queue mode: a background worker answers, the client polls the job
+        if settings.CHAT_QUEUE['enabled']:
+            return queued_response(jobs.enqueue(conversation, user_msg), user_msg)
+        
         # Get AI response
-        history = Message.objects.filter(conversation=conversation).order_by('-timestamp')[:10]
-        context = search_knowledge_base(user_message)
-        ai_response = get_ai_response(user_message, context, history)
+        history = recent_messages(conversation)
+        usage = {}
+        context = search_knowledge_base(user_message, usage=usage)
+        try:
+            ai_response = get_ai_response(
+                user_message, context, history, conversation.summary, user=request.user, usage=usage
+            )
+        except (RateLimited, ProviderUnavailable) as e:
+            # The model was not called: drop the question so a retry does not repeat it
+            user_msg.delete()
+            return retry_later_response(e)
         
         # Create AI message
         ai_msg = Message.objects.create(
@@ -644,45 +703,137 @@ def send_message(request):
             role='assistant',
             content=ai_response
         )
+        usage_log.record(ai_msg, request.user, usage)
         
-        # Update conversation title if first exchange
-        if conversation.message_count() == 2:
-            conversation.title = generate_conversation_title(user_message)
-        conversation.preview = user_message[:100]
-        conversation.save()
-        
-        # Update user profile stats
-        profile, created = UserProfile.objects.get_or_create(user=request.user)
-        profile.total_messages += 2
-        profile.save()
-        
-        # FIXED: Use get_or_create for settings
-        user_settings, created = UserSettings.objects.get_or_create(user=request.user)
-        if user_settings.chat_notifications:
-            Notification.objects.create(
-                user=request.user,
-                title="AI Response Received",
-                message=f"Your question about '{user_message[:50]}...' has been answered.",
-                notification_type='chat'
-            )
+        record_exchange(request.user, conversation, user_message)
         
         return JsonResponse({
-            'user_message': {
-                'id': user_msg.id,
-                'role': user_msg.role,
-                'content': user_msg.content,
-                'timestamp': user_msg.timestamp.isoformat()
-            },
-            'ai_message': {
-                'id': ai_msg.id,
-                'role': ai_msg.role,
-                'content': ai_msg.content,
-                'timestamp': ai_msg.timestamp.isoformat()
-            }
+            'user_message': message_data(user_msg),
+            'ai_message': message_data(ai_msg)
         })
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
+
+def message_data(msg):
+    return {
+        'id': msg.id,
+        'role': msg.role,
+        'content': msg.content,
+        'timestamp': msg.timestamp.isoformat()
+    }
+
+
+def queued_response(job, user_msg):
+    """202 Accepted pointing the client at the job to poll"""
+    return JsonResponse({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': reverse('api_message_job', args=[job.id]),
+        'user_message': message_data(user_msg),
+    }, status=202)
+
+
+@login_required
+@require_http_methods(["GET"])
+def message_job(request, job_id):
+    """Status of a queued answer; includes the assistant message once it is done"""
+    job = get_object_or_404(
+        ChatJob.objects.select_related('ai_message'), id=job_id, conversation__user=request.user
+    )
+    data = {'job_id': job.id, 'status': job.status}
+    if job.status == 'done' and job.ai_message is not None:
+        data['ai_message'] = message_data(job.ai_message)
+    elif job.status == 'failed':
+        data['error'] = job.error or 'Generation failed'
+    return JsonResponse(data)
+
+
+def retry_later_response(e):
+    """429 or 503 for a model call that was refused or failed fast, with a Retry-After hint"""
+    response = JsonResponse({'error': str(e), 'retry_after': e.retry_after}, status=e.status)
+    response['Retry-After'] = str(e.retry_after)
+    return response
+
+
+def sse_event(data, event=None):
+    """Format one Server-Sent Events frame with a JSON payload"""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+@login_required
+@require_http_methods(["POST"])
+def send_message_stream(request):
+    """
+    Streaming variant of send_message: answer tokens are sent as Server-Sent
+    Events while Gemini generates them. The assistant message is created up
+    front and its content saved every CHAT_STREAM_SAVE_INTERVAL seconds, so a
+    reload mid-answer shows what has arrived so far.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    conversation_id = data.get('conversation_id')
+    user_message = data.get('message')
+    
+    if not conversation_id or not user_message:
+        return JsonResponse({'error': 'Invalid request'}, status=400)
+    
+    conversation = get_object_or_404(Conversation, id=conversation_id, user=request.user)
+    
+    user_msg = Message.objects.create(conversation=conversation, role='user', content=user_message)
+    if settings.CHAT_QUEUE['enabled']:
+        return queued_response(jobs.enqueue(conversation, user_msg), user_msg)
+    # Read the history now, before the empty assistant message exists
+    history = recent_messages(conversation)
+    usage = {}
+    try:
+        context = search_knowledge_base(user_message, usage=usage)
+    except Exception as e:
+        # Nothing was answered: drop the question, as send_message reports the error
+        user_msg.delete()
+        return JsonResponse({'error': str(e)}, status=400)
+    try:
+        pieces = stream_ai_response(
+            user_message, context, history, conversation.summary, user=request.user, usage=usage
+        )
+    except (RateLimited, ProviderUnavailable) as e:
+        user_msg.delete()
+        return retry_later_response(e)
+    ai_msg = Message.objects.create(conversation=conversation, role='assistant', content='')
+    
+    def events():
+        parts = []
+        saved_at = time.monotonic()
+        finished = False
+        try:
+            yield sse_event({'user_message': message_data(user_msg), 'ai_message': message_data(ai_msg)}, 'start')
+            for text in pieces:
+                parts.append(text)
+                yield sse_event({'delta': text})
+                if time.monotonic() - saved_at >= settings.CHAT_STREAM_SAVE_INTERVAL:
+                    Message.objects.filter(id=ai_msg.id).update(content=''.join(parts))
+                    saved_at = time.monotonic()
+            finished = True
+        finally:
+            # Also runs when the client disconnects and the server closes the generator.
+            # Close the answer stream first, so its usage (completion tokens, time) is noted
+            pieces.close()
+            ai_msg.content = ''.join(parts)
+            Message.objects.filter(id=ai_msg.id).update(content=ai_msg.content)
+            usage_log.record(ai_msg, request.user, usage)
+            record_exchange(request.user, conversation, user_message)
+        if finished:
+            yield sse_event({'ai_message': message_data(ai_msg)}, 'done')
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Keep nginx and similar proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 @login_required
 @require_http_methods(["GET"])
 def get_conversation_messages(request, conversation_id):
@@ -777,5 +928,29 @@ def mark_notification_read(request, notification_id):
         notification.save()
         return JsonResponse({'success': True})
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=400) 
+        return JsonResponse({'error': str(e)}, status=400)
 
+@login_required
+@require_http_methods(["GET"])
+def search_suggest(request):
+    """Typeahead completions for the knowledge base search box"""
+    try:
+        limit = min(int(request.GET.get('limit', 8)), 10)
+    except ValueError:
+        limit = 8
+    ensure_current()
+    suggestions = get_suggest_index().suggest(request.GET.get('q', ''), limit)
+    return JsonResponse({'suggestions': suggestions})
+
+@login_required
+@require_http_methods(["GET"])
+def search_stats(request):
+    """Search result cache, answer cache, LLM single-flight and admission counters, for staff"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Forbidden'}, status=403)
+    return JsonResponse({
+        'cache': result_cache.stats(),
+        'answer_cache': answer_cache.stats(),
+        'llm': provider_stats(),
+        'admission': admission.stats(),
+    })
@@ -74,7 +74,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
             console.log('Sending message:', message, 'to conversation:', currentConversationId);
 
-            const response = await fetch('/api/message/send/', {
+            const response = await fetch('/api/message/stream/', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
@@ -86,22 +86,50 @@ document.addEventListener('DOMContentLoaded', function () {
                 })
             });
 
-            removeTypingIndicator();
+            // Over quota or model down: the server did not keep the question, ask the user to resend it
+            if (response.status === 429 || response.status === 503) {
+                removeTypingIndicator();
+                const errorData = await response.json();
+                appendMessage('assistant', errorData.error);
+                return;
+            }
 
             if (!response.ok) {
+                removeTypingIndicator();
                 const errorData = await response.json();
                 console.error('API error:', errorData);
                 throw new Error(errorData.error || errorData.detail || 'Failed to send message');
             }
 
-            const data = await response.json();
-            console.log('Response received:', data);
+            // Queue mode: the answer is generated in the background, poll until it is ready
+            if (response.status === 202) {
+                const job = await response.json();
+                const result = await pollJob(job.status_url);
+                removeTypingIndicator();
+                appendMessage('assistant', result.ai_message.content);
+                return;
+            }
 
-            // Add AI response to UI
-            if (data.ai_message && data.ai_message.content) {
-                appendMessage('assistant', data.ai_message.content);
-            } else {
-                throw new Error('Invalid response format from server');
+            // Render the answer token by token as Server-Sent Events arrive
+            let answer = '';
+            let bubble = null;
+            await readEventStream(response, (event, data) => {
+                if (data.delta) {
+                    if (!bubble) {
+                        removeTypingIndicator();
+                        bubble = appendMessage('assistant', '');
+                    }
+                    answer += data.delta;
+                    bubble.innerHTML = marked.parse(answer);
+                    messagesContainer.scrollTop = messagesContainer.scrollHeight;
+                } else if (event === 'done') {
+                    console.log('Response received:', data);
+                }
+            });
+
+            removeTypingIndicator();
+            if (!bubble) {
+                throw new Error('Empty response from server');
             }
 
         } catch (error) {
@@ -111,6 +139,57 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
+    // Give up polling a queued answer after this long, e.g. when no queue worker is running
+    const JOB_POLL_TIMEOUT_MS = 2 * 60 * 1000;
+
+    async function pollJob(statusUrl) {
+        const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+        let delay = 500;
+        while (true) {
+            if (Date.now() + delay > deadline) {
+                throw new Error('The answer is taking too long. Reload the conversation later to see if it arrived');
+            }
+            await new Promise(resolve => setTimeout(resolve, delay));
+            const response = await fetch(statusUrl);
+            const data = await response.json();
+            if (!response.ok || data.status === 'failed') {
+                throw new Error(data.error || 'Failed to generate a response');
+            }
+            if (data.status === 'done') {
+                return data;
+            }
+            // Back off gently while the answer is still being generated
+            delay = Math.min(delay * 1.5, 3000);
+        }
+    }
+
+    async function readEventStream(response, onEvent) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { done, value } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            // Frames are separated by a blank line
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const frame = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                for (const line of frame.split('\n')) {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                }
+                if (data) onEvent(event, JSON.parse(data));
+            }
+        }
+    }
+
     function appendMessage(role, content) {
         const messageDiv = document.createElement('div');
         messageDiv.className = `message ${role} slide-up`;
@@ -141,6 +220,7 @@ document.addEventListener('DOMContentLoaded', function () {
 
         messagesContainer.appendChild(messageDiv);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
+        return messageDiv.querySelector('.message-bubble');
     }
 
     function escapeHtml(text) {